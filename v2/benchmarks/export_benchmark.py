@@ -0,0 +1,124 @@
+"""
+Benchmark master-file export: time and peak memory for growing ledgers.
+
+Each size runs in its own process, since peak RSS (ru_maxrss) only grows
+over a process's lifetime.
+
+Usage:
+    python benchmarks/export_benchmark.py                 # 10k, 100k, 1M rows
+    python benchmarks/export_benchmark.py --rows 10000 50000
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fincat.excel_writer import ExcelWriter  # noqa: E402
+from fincat.parser import Transaction  # noqa: E402
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+BUSINESSES = ['שופרסל דיל', 'רמי לוי', 'קפה קפה', 'פז צומת', 'סופר פארם', 'נטפליקס',
+              'ארומה', 'חברת החשמל', 'אמזון', 'פנגו']
+CATEGORIES = ['מזון וסופרמרקט', 'מזון וסופרמרקט', 'מסעדות ובתי קפה', 'תחבורה ודלק',
+              'בריאות ורפואה', 'בידור ופנאי', 'מסעדות ובתי קפה', 'חשבונות ושירותים',
+              'קניות וביגוד', 'תחבורה ודלק']
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def make_config(root: Path) -> dict:
+    """Minimal configuration pointing at a scratch folder."""
+    return {
+        'folders': {'data': str(root)},
+        'excel': {'master_file': 'master.xlsx', 'file_lock_wait': 0},
+    }
+
+
+def fill_ledger(writer: ExcelWriter, rows: int, chunk: int = 5_000):
+    """Append synthetic transactions to the ledger in statement-sized chunks."""
+    start = datetime(2020, 1, 1)
+    categories = dict(zip(BUSINESSES, CATEGORIES))
+
+    for offset in range(0, rows, chunk):
+        transactions = [
+            Transaction(
+                date=start + timedelta(days=i % 1800),
+                card=str(1000 + i % 4),
+                business_name=f"{BUSINESSES[i % len(BUSINESSES)]} {i % 97}",
+                amount=round(10 + (i * 7.31) % 900, 2),
+                currency='₪',
+                installments='',
+                details='',
+                source_filename=f"statement_{i // 500}.xlsx"
+            )
+            for i in range(offset, min(rows, offset + chunk))
+        ]
+        writer.ledger.append(
+            transactions,
+            {t.business_name: categories[t.business_name.rsplit(' ', 1)[0]]
+             for t in transactions}
+        )
+
+
+def run_one(rows: int) -> dict:
+    """Build a ledger of `rows` transactions and export it (child process)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = ExcelWriter(make_config(Path(tmp)))
+        fill_ledger(writer, rows)
+
+        rss_before = peak_rss_mb()
+        started = time.perf_counter()
+        writer.export()
+        seconds = time.perf_counter() - started
+
+        return {
+            'rows': rows,
+            'seconds': seconds,
+            'peak_rss_mb': peak_rss_mb(),
+            'rss_before_mb': rss_before,
+            'file_mb': writer.master_file.stat().st_size / (1024 * 1024),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark master-file export')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_one(args.rows[0])))
+        return
+
+    print(f"{'Rows':>10}{'Export s':>11}{'Rows/s':>10}{'Peak RSS MB':>13}"
+          f"{'Before MB':>11}{'File MB':>9}")
+
+    for rows in args.rows:
+        output = subprocess.run(
+            [sys.executable, __file__, '--child', '--rows', str(rows)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+
+        print(f"{result['rows']:>10,}{result['seconds']:>11.1f}"
+              f"{result['rows'] / result['seconds']:>10,.0f}"
+              f"{result['peak_rss_mb']:>13.0f}{result['rss_before_mb']:>11.0f}"
+              f"{result['file_mb']:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
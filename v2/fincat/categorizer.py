@@ -2,18 +2,56 @@
 AI-powered transaction categorization using Claude.
 """
 
-import json
+import asyncio
 import logging
 import os
 import time
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Set, Tuple
 
 import anthropic
 import openpyxl
 
+from .circuit_breaker import CircuitBreaker
+from .deferred_queue import DeferredQueue
+from .ledger import Ledger
+from .merchant_cache import MerchantCache
+from .merchant_index import MerchantIndex
+from .normalizer import MerchantNormalizer
+from .parser import TransactionBatch
+from .rate_limiter import decorrelated_jitter, get_rate_limiter, retry_after_seconds
+from .rules import RuleEngine
+from .usage import UsageTracker, source_shares
+
 logger = logging.getLogger('fincat.categorizer')
 
+# Share of max_output_tokens that planned batches may fill
+OUTPUT_BUDGET_MARGIN = 0.8
+
+# Reply tokens not tied to any business
+OUTPUT_OVERHEAD_TOKENS = 8
+
+# Tool the model answers with
+CATEGORIZE_TOOL = 'assign_categories'
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimate the token count of text.
+
+    Hebrew tokenizes at close to one token per letter, while Latin text,
+    digits and punctuation average about three characters per token. The
+    estimate errs on the high side.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Estimated token count
+    """
+    hebrew = sum(1 for c in text if '\u0590' <= c <= '\u05FF')
+    return hebrew + (len(text) - hebrew + 2) // 3
+
 
 class Categorizer:
     """Categorize transactions using Claude AI."""
@@ -27,19 +65,88 @@ class Categorizer:
         """
         self.config = config
 
+        # The queue, usage and cache databases all live in the data folder
+        data_folder = Path(config['folders']['data'])
+        data_folder.mkdir(parents=True, exist_ok=True)
+
         # Initialize Anthropic client
         api_key = os.getenv('ANTHROPIC_API_KEY')
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY not set")
 
-        self.client = anthropic.Anthropic(api_key=api_key)
+        # Retries are ours (rate limiter + backoff), not the SDK's
+        self.api_key = api_key
+        self.base_url = config['ai'].get('base_url')  # e.g. a local test server
+        self.client = anthropic.Anthropic(api_key=api_key, base_url=self.base_url, max_retries=0)
         self.model = config['ai']['model']
         self.batch_size = config['ai']['batch_size']
         self.max_retries = config['ai']['max_retries']
+        self.concurrency = config['ai'].get('concurrency', 1)
+        self.max_output_tokens = config['ai'].get('max_output_tokens', 4096)
+
+        # Requests/tokens per minute, shared by all API calls in the process
+        self.rate_limiter = get_rate_limiter(config)
+        rate_config = config['ai'].get('rate_limit', {})
+        self.backoff_base = rate_config.get('backoff_base', 1)
+        self.backoff_cap = rate_config.get('backoff_cap', 30)
+
+        # Stop calling the API while it is down; what it couldn't categorize
+        # is queued and retried later
+        breaker_config = config['ai'].get('circuit_breaker', {})
+        self.circuit = CircuitBreaker(
+            failure_threshold=breaker_config.get('failure_threshold', 5),
+            reset_timeout=breaker_config.get('reset_timeout', 60)
+        )
+        self.deferred = DeferredQueue(data_folder)
+        self.max_deferred_attempts = breaker_config.get('max_attempts', 5)
+
+        # Token/cost accounting and optional budgets (local-only once spent)
+        self.usage = UsageTracker(config)
 
         # Load categories
         self.categories = self._load_categories()
 
+        # Reply tokens per business for one {"b": n, "c": n} assignment
+        self.output_tokens_per_business = (
+            len(str(self.batch_size)) + len(str(len(self.categories))) + 10
+        )
+
+        # Static prompt prefix, shared by every request
+        self.prompt_cache = config['ai'].get('prompt_cache', True)
+        self.system_prompt = self._build_system_prompt()
+        self.tool = self._build_tool()
+
+        # Canonical merchant keys for lookups (original names kept for output)
+        self.normalizer = MerchantNormalizer(config)
+
+        # Offline rules, consulted before the cache and the API
+        self.rules = RuleEngine(config, self.categories)
+
+        # Similarity index over merchants already in the ledger
+        fuzzy_config = config['ai'].get('fuzzy', {})
+        self.fuzzy_threshold = fuzzy_config.get('threshold', 0.75)
+        self.merchant_index = None
+        if fuzzy_config.get('enabled', True):
+            ledger = Ledger(config)
+            try:
+                self.merchant_index = MerchantIndex.from_ledger(
+                    ledger, self.normalizer.normalize, n=fuzzy_config.get('ngram', 3)
+                )
+            finally:
+                ledger.close()
+
+        # Persistent cache of businesses categorized in earlier runs
+        cache_config = config['ai'].get('cache', {})
+        self.cache = None
+        if cache_config.get('enabled', True):
+            self.cache = MerchantCache(
+                Path(config['folders']['data']),
+                model=self.model,
+                categories=self.categories,
+                ttl_days=cache_config.get('ttl_days', 180),
+                max_entries=cache_config.get('max_entries', 20000)
+            )
+
     def _load_categories(self) -> List[str]:
         """Load categories from reference file, create if doesn't exist."""
         data_folder = Path(self.config['folders']['data'])
@@ -95,155 +202,674 @@ class Categorizer:
         Categorize all transactions.
 
         Args:
-            transactions: List of Transaction objects
+            transactions: TransactionBatch or list of Transaction objects
 
         Returns:
             Dictionary mapping business name to category
         """
-        # Get unique business names
-        business_names = list(set(t.business_name for t in transactions))
+        # Get unique business names (a batch already keeps them encoded)
+        if isinstance(transactions, TransactionBatch):
+            business_names = transactions.unique_business_names()
+            names = transactions.business_name.values
+            files = transactions.source_filename.values
+            sources = {
+                (names[name], files[source]) for name, source in
+                zip(transactions.business_name.codes, transactions.source_filename.codes)
+            }
+        else:
+            business_names = list(set(t.business_name for t in transactions))
+            sources = {(t.business_name, t.source_filename) for t in transactions}
+
+        return self.categorize_names(business_names, sources=sources)
+
+    def categorize_names(self, business_names: List[str],
+                         sources: Set[Tuple[str, str]] = None) -> Dict[str, str]:
+        """
+        Categorize business names (rules, cache, similar merchants, then API).
+
+        Args:
+            business_names: Unique business names
+            sources: (business name, source file) pairs, used to split API
+                usage between the files whose businesses are sent to it
+
+        Returns:
+            Dictionary mapping business name to category
+        """
+
+        # Spelling variants of one merchant share a canonical key; the first
+        # spelling seen represents the merchant in API prompts
+        canonical = {name: self.normalizer.normalize(name) for name in business_names}
+        representatives = {}
+        for name, key in canonical.items():
+            representatives.setdefault(key, name)
+
+        logger.info(
+            f"Categorizing {len(business_names)} unique businesses "
+            f"({len(representatives)} after normalization)"
+        )
+
+        # Categories by canonical key
+        key_categories = {}
+
+        # Local rules come first: no network call, and they take precedence
+        # over answers cached from the API
+        for key, name in representatives.items():
+            category = self.rules.match(name)
+            if category is not None:
+                key_categories[key] = category
+
+        if key_categories:
+            logger.info(f"Rules: {len(key_categories)}/{len(representatives)} businesses matched")
+
+        # Businesses seen in earlier runs don't need the API
+        remaining = [key for key in representatives if key not in key_categories]
+        if self.cache is not None and remaining:
+            cached = self.cache.get_many(remaining)
+            key_categories.update(cached)
+            hit_rate = len(cached) / len(remaining) * 100
+            logger.info(
+                f"Cache: {len(cached)}/{len(remaining)} businesses "
+                f"already categorized ({hit_rate:.0f}% hit rate)"
+            )
+
+        # Near-variants of merchants already in the master file take the
+        # neighbour's category
+        if self.merchant_index is not None:
+            pending = [key for key in representatives if key not in key_categories]
+            similar = 0
+
+            for key in pending:
+                nearest = self.merchant_index.nearest(key)
+                if nearest is not None and nearest[2] >= self.fuzzy_threshold:
+                    neighbour, category, similarity = nearest
+                    key_categories[key] = category
+                    similar += 1
+                    logger.debug(
+                        f"'{representatives[key]}' resembles '{neighbour}' "
+                        f"({similarity:.2f}), using '{category}'"
+                    )
+
+            if similar:
+                logger.info(f"Similar merchants: {similar}/{len(pending)} businesses matched")
+
+        uncached = [
+            name for key, name in representatives.items() if key not in key_categories
+        ]
+
+        # Only files with businesses going to the API share its cost
+        if uncached:
+            sent = {canonical[name] for name in uncached}
+            self.usage.start_run(source_shares(
+                (canonical[name], source) for name, source in sources or ()
+                if canonical.get(name) in sent
+            ))
+
+        # Process in batches sized to fit the output token budget
+        results = self._categorize_batches(self._plan_batches(uncached))
+
+        if uncached:
+            self._log_throttling()
+
+        for batch_categories in results:
+            new_categories = {
+                canonical[name]: category
+                for name, category in batch_categories.items() if name in canonical
+            }
+            key_categories.update(new_categories)
+
+            if self.cache is not None:
+                self.cache.put_many(new_categories)
+
+        # Keep the similarity index current for the next file
+        if self.merchant_index is not None:
+            for key, category in key_categories.items():
+                self.merchant_index.add(key, category)
+
+        # Queue what the API left uncategorized for a later retry
+        failed_keys = {
+            canonical[name] for name in uncached
+            if key_categories.get(canonical[name], 'לא סווג') == 'לא סווג'
+        }
+        if failed_keys:
+            self.deferred.add_many(
+                name for name, key in canonical.items() if key in failed_keys
+            )
+            logger.warning(f"{len(failed_keys)} businesses queued for re-categorization")
+
+        # Map back to the original names used in the statements
+        return {
+            name: key_categories.get(key, 'לא סווג') for name, key in canonical.items()
+        }
+
+    def recategorize_deferred(self) -> Dict[str, str]:
+        """
+        Retry the businesses queued while the API was unavailable.
+
+        Does nothing while the circuit is open. Businesses stay queued
+        until the caller has written their new category and removes them
+        (deferred.remove_many), so a failed write loses nothing. A business
+        the API answered for but left uncategorized max_attempts times is
+        dropped from the queue; its rows stay 'לא סווג'.
+
+        Returns:
+            Dictionary mapping business name to its new category
+        """
+        if not self.circuit.ready():
+            return {}
+
+        business_names = self.deferred.pending()
+        if not business_names:
+            return {}
+
+        logger.info(f"Re-categorizing {len(business_names)} deferred businesses")
+        calls_before = self.usage.run_calls
+        categories = self.categorize_names(
+            business_names, sources={(name, 'deferred') for name in business_names}
+        )
+
+        resolved = {
+            name: category for name, category in categories.items() if category != 'לא סווג'
+        }
+
+        # Only retries the API actually answered count towards the limit,
+        # so an outage or a spent budget doesn't use up attempts
+        if self.usage.run_calls > calls_before and self.circuit.failures == 0:
+            self.deferred.record_attempt(name for name in business_names if name not in resolved)
+            dropped = self.deferred.drop_exhausted(self.max_deferred_attempts)
+            if dropped:
+                logger.warning(
+                    f"Giving up on {len(dropped)} businesses left uncategorized after "
+                    f"{self.max_deferred_attempts} attempts: {', '.join(dropped[:10])}"
+                )
+        logger.info(
+            f"Deferred: {len(resolved)}/{len(business_names)} businesses categorized, "
+            f"{len(business_names) - len(resolved)} still queued"
+        )
+        return resolved
+
+    def _estimate_input_tokens(self, business_names: List[str]) -> int:
+        """Estimate prompt tokens for a batch (cached prefix included)."""
+        return self._request_tokens(self._build_prompt(business_names))
+
+    def _plan_batches(self, business_names: List[str]) -> List[List[str]]:
+        """
+        Split business names into batches whose replies fit max_output_tokens.
+
+        batch_size still caps the number of names per batch. A margin is
+        left because estimates are approximate, and truncated replies are
+        split and retried anyway.
+
+        Args:
+            business_names: Business names to categorize
+
+        Returns:
+            Lists of business names
+        """
+        budget = int(self.max_output_tokens * OUTPUT_BUDGET_MARGIN)
+
+        batches = []
+        current = []
+        used = OUTPUT_OVERHEAD_TOKENS
+
+        for name in business_names:
+            cost = self.output_tokens_per_business
+            if current and (len(current) >= self.batch_size or used + cost > budget):
+                batches.append(current)
+                current = []
+                used = OUTPUT_OVERHEAD_TOKENS
+
+            current.append(name)
+            used += cost
+
+        if current:
+            batches.append(current)
+
+        if batches:
+            logger.debug(
+                f"Planned {len(batches)} batches for {len(business_names)} businesses "
+                f"(~{self._estimate_input_tokens(batches[0])} input tokens for the first)"
+            )
+
+        return batches
+
+    def _categorize_batches(self, batches: List[List[str]]) -> List[Dict[str, str]]:
+        """
+        Categorize several batches, concurrently when configured.
 
-        logger.info(f"Categorizing {len(business_names)} unique businesses")
+        Args:
+            batches: Lists of business names
 
-        all_categories = {}
+        Returns:
+            One business name → category dictionary per batch, in batch order
+        """
+        if self.concurrency > 1 and len(batches) > 1:
+            return asyncio.run(self._categorize_batches_async(batches))
 
-        # Process in batches
-        for i in range(0, len(business_names), self.batch_size):
-            batch = business_names[i:i + self.batch_size]
-            logger.debug(f"Processing batch {i//self.batch_size + 1} ({len(batch)} businesses)")
+        results = []
+        for i, batch in enumerate(batches):
+            logger.debug(f"Processing batch {i + 1} ({len(batch)} businesses)")
+            results.append(self._categorize_batch(batch))
+        return results
 
-            batch_categories = self._categorize_batch(batch)
-            all_categories.update(batch_categories)
+    async def _categorize_batches_async(self, batches: List[List[str]]) -> List[Dict[str, str]]:
+        """
+        Categorize batches with at most `concurrency` requests in flight.
 
-        return all_categories
+        A fresh async client is used per run, since its connection pool is
+        bound to the event loop that asyncio.run() creates.
 
-    def _categorize_batch(self, business_names: List[str]) -> Dict[str, str]:
+        Args:
+            batches: Lists of business names
+
+        Returns:
+            One business name → category dictionary per batch, in batch order
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        logger.debug(f"Processing {len(batches)} batches, up to {self.concurrency} at a time")
+
+        async with anthropic.AsyncAnthropic(api_key=self.api_key, base_url=self.base_url,
+                                            max_retries=0) as client:
+
+            async def run(batch: List[str]) -> Dict[str, str]:
+                async with semaphore:
+                    return await self._categorize_batch_async(client, batch)
+
+            return await asyncio.gather(*(run(batch) for batch in batches))
+
+    def _categorize_batch(self, business_names: List[str], round_: int = 1) -> Dict[str, str]:
         """
         Categorize a batch of business names using Claude API.
 
         Args:
             business_names: List of business names
+            round_: Request round (businesses missing from a reply are
+                re-requested in the next round, up to max_retries rounds)
 
         Returns:
             Dictionary mapping business name to category
         """
         prompt = self._build_prompt(business_names)
 
-        response_text = self._call_api_with_retry(prompt)
+        response = self._call_api_with_retry(prompt)
+
+        # Reply cut off at max_tokens: retry each half instead of losing the batch
+        if self._should_split(response, business_names):
+            half = len(business_names) // 2
+            categories = self._categorize_batch(business_names[:half], round_)
+            categories.update(self._categorize_batch(business_names[half:], round_))
+            return categories
 
-        if response_text:
-            return self._parse_response(response_text, business_names)
+        categories = self._batch_result(response, business_names)
+
+        # Ask again for the businesses the reply left out, not the whole batch
+        missing = self._missing_to_retry(response, categories, business_names, round_)
+        if missing:
+            categories.update(self._categorize_batch(missing, round_ + 1))
+
+        return self._fill_missing(categories, business_names)
+
+    async def _categorize_batch_async(self, client: anthropic.AsyncAnthropic,
+                                      business_names: List[str], round_: int = 1) -> Dict[str, str]:
+        """Async variant of _categorize_batch using a shared async client."""
+        prompt = self._build_prompt(business_names)
+
+        response = await self._call_api_with_retry_async(client, prompt)
+
+        # Halves run one after the other to stay within the concurrency limit
+        if self._should_split(response, business_names):
+            half = len(business_names) // 2
+            categories = await self._categorize_batch_async(client, business_names[:half], round_)
+            categories.update(
+                await self._categorize_batch_async(client, business_names[half:], round_)
+            )
+            return categories
+
+        categories = self._batch_result(response, business_names)
+
+        missing = self._missing_to_retry(response, categories, business_names, round_)
+        if missing:
+            categories.update(await self._categorize_batch_async(client, missing, round_ + 1))
+
+        return self._fill_missing(categories, business_names)
+
+    def _should_split(self, response, business_names: List[str]) -> bool:
+        """Check whether a reply was truncated and the batch can be split."""
+        if response is None or response.stop_reason != 'max_tokens':
+            return False
+
+        if len(business_names) < 2:
+            logger.warning(f"Reply truncated for a single business: '{business_names[0]}'")
+            return False
+
+        logger.warning(
+            f"Reply truncated at {self.max_output_tokens} tokens, "
+            f"splitting batch of {len(business_names)} businesses"
+        )
+        return True
+
+    def _batch_result(self, response, business_names: List[str]) -> Dict[str, str]:
+        """Parse a batch response (empty if the API failed)."""
+        if response is not None:
+            return self._parse_response(response, business_names)
         else:
             # API failed, return uncategorized
-            logger.warning("API failed, marking all as uncategorized")
-            return {name: "לא סווג" for name in business_names}
+            logger.warning("No API reply (failed or over budget), marking all as uncategorized")
+            return {}
+
+    def _missing_to_retry(self, response, categories: Dict[str, str],
+                          business_names: List[str], round_: int) -> List[str]:
+        """Return businesses absent from a successful reply, if another round is allowed."""
+        if response is None or round_ >= self.max_retries:
+            return []
+
+        missing = [name for name in business_names if name not in categories]
+        if missing:
+            logger.warning(
+                f"{len(missing)}/{len(business_names)} businesses missing from reply, "
+                f"re-requesting them"
+            )
+        return missing
+
+    def _fill_missing(self, categories: Dict[str, str], business_names: List[str]) -> Dict[str, str]:
+        """Mark businesses that still have no category as 'לא סווג'."""
+        for business in business_names:
+            if business not in categories:
+                logger.warning(f"Missing category for '{business}', using 'לא סווג'")
+                categories[business] = 'לא סווג'
 
-    def _build_prompt(self, business_names: List[str]) -> str:
-        """Build categorization prompt for Claude."""
-        categories_text = "\n".join(f"- {cat}" for cat in self.categories)
+        return categories
 
-        businesses_text = "\n".join(
-            f"{i+1}. {name}" for i, name in enumerate(business_names)
+    def _build_system_prompt(self) -> str:
+        """
+        Build the static part of the prompt (categories and instructions).
+
+        It is identical for every batch, so it goes first and is marked for
+        prompt caching; only the business names change between requests.
+        """
+        categories_text = "\n".join(
+            f"{i+1}. {cat}" for i, cat in enumerate(self.categories)
         )
 
         return f"""You are categorizing Israeli credit card transactions.
 
-Available categories (Hebrew):
+Available categories (Hebrew), by number:
 {categories_text}
 
-Transaction business names (Hebrew):
-{businesses_text}
-
 Instructions:
-1. Match each business to the most appropriate category
+1. Match each numbered business to the most appropriate category
 2. Consider the business type, not just the name
 3. Use "אחר" (Other) only if you're uncertain
-4. Return valid JSON only, no additional text
+4. Record every business with the {CATEGORIZE_TOOL} tool, by number
+"""
 
-Return JSON mapping each business name to its category.
-Format: {{"business_name": "category_name"}}
-Example: {{"רמי לוי": "מזון וסופרמרקט", "קפה גרג": "מסעדות ובתי קפה"}}
+    def _build_prompt(self, business_names: List[str]) -> str:
+        """Build the per-batch part of the prompt (business names only)."""
+        businesses_text = "\n".join(
+            f"{i+1}. {name}" for i, name in enumerate(business_names)
+        )
+
+        return f"""Transaction business names (Hebrew):
+{businesses_text}
 """
 
-    def _call_api_with_retry(self, prompt: str) -> str:
+    def _request_params(self, prompt: str) -> dict:
+        """Build Messages API parameters for a prompt."""
+        system_block = {"type": "text", "text": self.system_prompt}
+        if self.prompt_cache:
+            # Later requests read the prefix (tool schema, categories and
+            # instructions) from cache instead of re-paying for it; ignored
+            # by the API while it is below the model's minimum cacheable length
+            system_block["cache_control"] = {"type": "ephemeral"}
+
+        return {
+            'model': self.model,
+            'max_tokens': self.max_output_tokens,
+            'temperature': 0,
+            'system': [system_block],
+            'tools': [self.tool],
+            'tool_choice': {"type": "tool", "name": CATEGORIZE_TOOL},
+            'messages': [{"role": "user", "content": prompt}]
+        }
+
+    def _worst_case_cost(self, tokens: int) -> float:
+        """Cost of a request if its reply used the whole output budget."""
+        return self.usage.cost(tokens, self.max_output_tokens)
+
+    def _log_usage(self, response, latency: float):
+        """Log and record token usage for a response."""
+        usage = response.usage
+        self.usage.record(usage, latency)
+
+        # Log token usage for cost tracking
+        logger.info(
+            f"API call successful: {usage.input_tokens} in, "
+            f"{usage.output_tokens} out tokens "
+            f"(cache: {getattr(usage, 'cache_read_input_tokens', None) or 0} read, "
+            f"{getattr(usage, 'cache_creation_input_tokens', None) or 0} written), "
+            f"{latency:.1f}s"
+        )
+
+    def _log_throttling(self):
+        """Log time spent waiting on the rate limiter so far in this process."""
+        stats = self.rate_limiter.stats()
+        if stats['throttled_requests'] or stats['server_pauses']:
+            logger.info(
+                f"Rate limiter: {stats['throttled_requests']}/{stats['requests']} requests "
+                f"throttled, {stats['throttled_seconds']:.1f}s waited, "
+                f"{stats['server_pauses']} server pauses"
+            )
+
+    def _request_tokens(self, prompt: str) -> int:
+        """Estimate the input tokens a request counts against the limit."""
+        return estimate_tokens(self.system_prompt) + estimate_tokens(prompt)
+
+    def _settle_tokens(self, estimated: int, response):
+        """Replace a request's token estimate with the usage the server reported."""
+        usage = response.usage
+        actual = usage.input_tokens + (getattr(usage, 'cache_creation_input_tokens', None) or 0)
+        self.rate_limiter.settle(estimated, actual)
+
+    def _record_error(self, error: Exception):
+        """Count an API error towards the circuit breaker if it signals an outage."""
+        status = getattr(error, 'status_code', None)
+        if status is None or status == 429 or status >= 500:
+            self.circuit.record_failure()
+        else:
+            # The service answered; the request itself was rejected
+            self.circuit.record_success()
+
+    def _retry_wait(self, attempt: int, error: Exception, previous: float):
         """
-        Call Claude API with exponential backoff retry.
+        Return seconds to wait before retrying, or None to give up.
+
+        The server's Retry-After wins when present (and, for rate limit and
+        overload errors, pauses every request in the process); otherwise
+        the wait grows with decorrelated jitter.
+
+        Args:
+            attempt: Zero-based attempt that just failed
+            error: The API error raised
+            previous: Previous wait in seconds (backoff_base before the first)
+
+        Returns:
+            Wait time in seconds, or None after the last attempt
+        """
+        if attempt == self.max_retries - 1:
+            logger.error(f"API failed after {self.max_retries} attempts: {error}")
+            return None
+
+        if self.circuit.is_open:
+            logger.error(f"API failed, not retrying while the circuit is open: {error}")
+            return None
+
+        wait_time = retry_after_seconds(error)
+        if wait_time is not None:
+            if getattr(error, 'status_code', None) in (429, 529):
+                self.rate_limiter.pause(wait_time)
+        else:
+            wait_time = decorrelated_jitter(previous, self.backoff_base, self.backoff_cap)
+
+        logger.warning(
+            f"API error, retrying in {wait_time:.1f}s... "
+            f"(attempt {attempt+1}/{self.max_retries}): {error}"
+        )
+        return wait_time
+
+    def _call_api_with_retry(self, prompt: str) -> Optional[anthropic.types.Message]:
+        """
+        Call Claude API within the rate limit, retrying with backoff.
 
         Args:
             prompt: Prompt to send to API
 
         Returns:
-            Response text or None if failed
+            API response message, or None if failed
         """
+        tokens = self._request_tokens(prompt)
+        wait_time = self.backoff_base
+
         for attempt in range(self.max_retries):
-            try:
-                response = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=1024,
-                    temperature=0,
-                    messages=[{"role": "user", "content": prompt}]
-                )
+            if not self.usage.allows(self._worst_case_cost(tokens)):
+                return None
 
-                # Log token usage for cost tracking
-                logger.info(
-                    f"API call successful: {response.usage.input_tokens} in, "
-                    f"{response.usage.output_tokens} out tokens"
-                )
+            if not self.circuit.allow():
+                logger.debug("API circuit open, skipping request")
+                return None
 
-                return response.content[0].text
+            self.rate_limiter.acquire(tokens)
+            start = time.monotonic()
+            try:
+                response = self.client.messages.create(**self._request_params(prompt))
+                self.circuit.record_success()
+                self._settle_tokens(tokens, response)
+                self._log_usage(response, time.monotonic() - start)
+                return response
 
             except anthropic.APIError as e:
-                if attempt == self.max_retries - 1:
-                    logger.error(f"API failed after {self.max_retries} attempts: {e}")
+                self._record_error(e)
+                wait_time = self._retry_wait(attempt, e, wait_time)
+                if wait_time is None:
                     return None
-
-                wait_time = 2 ** attempt  # 1s, 2s, 4s
-                logger.warning(
-                    f"API error, retrying in {wait_time}s... "
-                    f"(attempt {attempt+1}/{self.max_retries}): {e}"
-                )
                 time.sleep(wait_time)
 
         return None
 
-    def _parse_response(self, response_text: str, business_names: List[str]) -> Dict[str, str]:
+    async def _call_api_with_retry_async(self, client: anthropic.AsyncAnthropic,
+                                         prompt: str) -> Optional[anthropic.types.Message]:
         """
-        Parse JSON response from Claude.
+        Async variant of _call_api_with_retry (waits don't block other batches).
 
         Args:
-            response_text: Response from API
-            business_names: Original business names
+            client: Async Anthropic client
+            prompt: Prompt to send to API
 
         Returns:
-            Dictionary mapping business name to category
+            API response message, or None if failed
         """
-        try:
-            # Extract JSON from response (might have markdown code blocks)
-            if '```json' in response_text:
-                response_text = response_text.split('```json')[1].split('```')[0]
-            elif '```' in response_text:
-                response_text = response_text.split('```')[1].split('```')[0]
-
-            categories = json.loads(response_text.strip())
-
-            # Validate categories
-            valid_categories = set(self.categories)
-            for business, category in categories.items():
-                if category not in valid_categories:
-                    logger.warning(
-                        f"Invalid category '{category}' for '{business}', using 'אחר'"
-                    )
-                    categories[business] = 'אחר'
+        tokens = self._request_tokens(prompt)
+        wait_time = self.backoff_base
+
+        for attempt in range(self.max_retries):
+            if not self.usage.allows(self._worst_case_cost(tokens)):
+                return None
 
-            # Fill in any missing businesses
-            for business in business_names:
-                if business not in categories:
-                    logger.warning(f"Missing category for '{business}', using 'לא סווג'")
-                    categories[business] = 'לא סווג'
+            if not self.circuit.allow():
+                logger.debug("API circuit open, skipping request")
+                return None
 
-            return categories
+            await self.rate_limiter.acquire_async(tokens)
+            start = time.monotonic()
+            try:
+                response = await client.messages.create(**self._request_params(prompt))
+                self.circuit.record_success()
+                self._settle_tokens(tokens, response)
+                self._log_usage(response, time.monotonic() - start)
+                return response
 
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse API response as JSON: {e}")
-            logger.debug(f"Response text: {response_text[:200]}")
-            return {name: "לא סווג" for name in business_names}
+            except anthropic.APIError as e:
+                self._record_error(e)
+                wait_time = self._retry_wait(attempt, e, wait_time)
+                if wait_time is None:
+                    return None
+                await asyncio.sleep(wait_time)
+
+        return None
+
+    def _build_tool(self) -> dict:
+        """
+        Build the tool schema the model must answer with.
+
+        Category numbers are an enum, so every assignment arrives as a valid
+        category; business and category are referenced by number to keep
+        the reply short.
+        """
+        return {
+            "name": CATEGORIZE_TOOL,
+            "description": "Record the category number chosen for each numbered business.",
+            "input_schema": {
+                "type": "object",
+                "properties": {
+                    "assignments": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "b": {"type": "integer", "description": "Business number"},
+                                "c": {
+                                    "type": "integer",
+                                    "description": "Category number",
+                                    "enum": list(range(1, len(self.categories) + 1))
+                                }
+                            },
+                            "required": ["b", "c"]
+                        }
+                    }
+                },
+                "required": ["assignments"]
+            }
+        }
+
+    def _parse_response(self, response, business_names: List[str]) -> Dict[str, str]:
+        """
+        Read category assignments from the tool call in Claude's reply.
+
+        Args:
+            response: API response
+            business_names: Business names in the order they were numbered
+
+        Returns:
+            Dictionary mapping business name to category (businesses the
+            reply left out are absent)
+        """
+        categories = {}
+
+        assignments = []
+        for block in response.content:
+            if block.type == 'tool_use' and block.name == CATEGORIZE_TOOL:
+                assignments = block.input.get('assignments') or []
+                break
+        else:
+            logger.error("API response contains no category assignments")
+
+        for assignment in assignments:
+            try:
+                business_idx = int(assignment['b']) - 1
+                category_idx = int(assignment['c']) - 1
+            except (KeyError, TypeError, ValueError):
+                logger.warning(f"Ignoring malformed assignment: {assignment}")
+                continue
+
+            if not 0 <= business_idx < len(business_names):
+                logger.warning(f"Reply refers to unknown business #{business_idx + 1}, ignoring")
+                continue
+
+            business = business_names[business_idx]
+            if 0 <= category_idx < len(self.categories):
+                categories[business] = self.categories[category_idx]
+            else:
+                logger.warning(
+                    f"Invalid category #{category_idx + 1} for '{business}', using 'אחר'"
+                )
+                categories[business] = 'אחר'
+
+        return categories
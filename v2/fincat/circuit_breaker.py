@@ -0,0 +1,102 @@
+"""
+Circuit breaker that stops calling the API while it keeps failing.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger('fincat.circuit_breaker')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Fail fast after consecutive API errors.
+
+    Closed: requests flow normally. After failure_threshold consecutive
+    failures the circuit opens and requests are refused immediately. Once
+    reset_timeout has passed a single probe request is let through
+    (half-open); its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60):
+        """
+        Initialize breaker (closed).
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a probe
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def ready(self) -> bool:
+        """Check whether a request would be let through (does not change state)."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                return time.monotonic() - self.opened_at >= self.reset_timeout
+            return not self._probing
+
+    def allow(self) -> bool:
+        """
+        Ask permission to send a request.
+
+        Returns:
+            True if the request may be sent, False to fail fast
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                logger.info("API circuit half-open, sending a probe request")
+                self.state = HALF_OPEN
+
+            # Half-open: one probe at a time
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        """Record a successful request (closes the circuit)."""
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("API circuit closed, requests resume")
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        """Record a failed request (may open the circuit)."""
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(
+                        f"API circuit open after {self.failures} consecutive failures, "
+                        f"pausing requests for {self.reset_timeout}s"
+                    )
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        """True while requests are being refused."""
+        return self.state == OPEN
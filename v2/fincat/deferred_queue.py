@@ -0,0 +1,133 @@
+"""
+Persistent queue of businesses left uncategorized (SQLite in the data folder).
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, List
+
+logger = logging.getLogger('fincat.deferred_queue')
+
+
+class DeferredQueue:
+    """
+    Businesses written as 'לא סווג' because the API was unavailable.
+
+    They are re-categorized later and their master-file rows patched, so an
+    outage doesn't leave rows uncategorized for good. Names are stored as
+    they appear on the statements, since that is what the rows contain.
+    attempts counts the retries the API answered without categorizing the
+    business, so names it never categorizes can be dropped.
+    """
+
+    def __init__(self, data_folder: Path):
+        """
+        Open (or create) the queue database.
+
+        Args:
+            data_folder: Data folder path (database lives here)
+        """
+        self.db_path = Path(data_folder) / '.deferred.db'
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS deferred (
+                business_name TEXT PRIMARY KEY,
+                queued_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM deferred").fetchone()[0]
+
+    def add_many(self, business_names: Iterable[str]):
+        """
+        Queue businesses (already queued ones are left as they are).
+
+        Args:
+            business_names: Business names as written to the master file
+        """
+        now = time.time()
+        rows = [(name, now) for name in business_names]
+
+        if not rows:
+            return
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO deferred (business_name, queued_at) VALUES (?, ?) "
+                "ON CONFLICT(business_name) DO NOTHING",
+                rows
+            )
+            self._conn.commit()
+
+    def pending(self) -> List[str]:
+        """Return queued business names, oldest first."""
+        with self._lock:
+            return [
+                row[0] for row in
+                self._conn.execute("SELECT business_name FROM deferred ORDER BY queued_at")
+            ]
+
+    def record_attempt(self, business_names: Iterable[str]):
+        """
+        Count a retry that the API answered but left these businesses uncategorized.
+
+        Args:
+            business_names: Business names still uncategorized
+        """
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE deferred SET attempts = attempts + 1 WHERE business_name = ?",
+                [(name,) for name in business_names]
+            )
+            self._conn.commit()
+
+    def drop_exhausted(self, max_attempts: int) -> List[str]:
+        """
+        Stop retrying businesses that have used up their attempts.
+
+        Args:
+            max_attempts: Answered retries allowed per business
+
+        Returns:
+            Business names removed from the queue
+        """
+        with self._lock:
+            names = [
+                row[0] for row in self._conn.execute(
+                    "SELECT business_name FROM deferred WHERE attempts >= ?", (max_attempts,)
+                )
+            ]
+            self._conn.execute("DELETE FROM deferred WHERE attempts >= ?", (max_attempts,))
+            self._conn.commit()
+
+        return names
+
+    def remove_many(self, business_names: Iterable[str]):
+        """
+        Drop businesses that have been categorized.
+
+        Args:
+            business_names: Business names to remove
+        """
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM deferred WHERE business_name = ?",
+                [(name,) for name in business_names]
+            )
+            self._conn.commit()
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
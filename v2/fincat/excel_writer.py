@@ -3,15 +3,29 @@ Master Excel file management.
 """
 
 import logging
+import threading
 import time
-from datetime import datetime
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
+
+from .ledger import INDEX_SHEET, Ledger, display_date
 
 logger = logging.getLogger('fincat.excel_writer')
 
+# Period key length per excel.partition setting (dates are YYYY-MM-DD)
+PARTITION_KEY_LENGTHS = {'none': 0, 'month': 7, 'year': 4}
+
+INDEX_HEADERS = [
+    'תקופה',           # Period
+    'מטבע',            # Currency
+    'שורות',           # Rows
+    'סה"כ',            # Total
+    'מיקום'            # Sheet or file
+]
+
 
 class FileLockedError(Exception):
     """Raised when Excel file is locked (open in Excel)."""
@@ -19,7 +33,14 @@ class FileLockedError(Exception):
 
 
 class ExcelWriter:
-    """Manage master Excel tracking file."""
+    """
+    Record transactions in the ledger and export the master Excel file.
+
+    Appends go to the ledger (cheap, independent of history size) and mark
+    their months stale; the master file is regenerated from the ledger by
+    export(), on demand or on a schedule, instead of on every append. With
+    partition files, only the periods that changed are rewritten.
+    """
 
     def __init__(self, config: dict):
         """
@@ -36,57 +57,360 @@ class ExcelWriter:
         self.master_file = data_folder / config['excel']['master_file']
         self.lock_wait = config['excel']['file_lock_wait']
 
-    def append_transactions(self, transactions: List, categories: Dict[str, str]):
+        # Optional split of the export by period: 'month' or 'year' sheets,
+        # or separate files per period when partition_files is set
+        self.partition = config['excel'].get('partition', 'none')
+        self.partition_files = config['excel'].get('partition_files', False)
+        if self.partition not in PARTITION_KEY_LENGTHS:
+            raise ValueError(
+                f"Invalid excel.partition '{self.partition}' "
+                f"(expected one of: {', '.join(PARTITION_KEY_LENGTHS)})"
+            )
+
+        # Primary store (imports an existing master file the first time)
+        self.ledger = Ledger(config)
+
+        # Nothing exported yet: every month needs writing
+        if not self.master_file.exists() and len(self.ledger):
+            self.ledger.mark_dirty()
+
+        logger.info(
+            f"{self.master_file.name} is generated from {self.ledger.db_path.name}: "
+            f"changes made to it in Excel are overwritten by the next export"
+        )
+
+        # One export at a time (background thread, CLI, shutdown)
+        self._export_lock = threading.Lock()
+        self._wait_for_locks = True
+
+        # Background export thread (watch mode), see start_background_export()
+        self._export_thread = None
+        self._export_wanted = threading.Event()
+        self._export_stop = threading.Event()
+
+    @property
+    def dirty(self) -> bool:
+        """True if the ledger changed since the master file was exported."""
+        return bool(self.ledger.dirty_months())
+
+    def append_transactions(self, transactions: List,
+                            categories: Dict[str, str]) -> Dict[str, int]:
         """
-        Append transactions to master file.
+        Append transactions to the ledger, skipping ones already recorded.
 
         Args:
-            transactions: List of Transaction objects
+            transactions: TransactionBatch or list of Transaction objects
             categories: Dictionary mapping business name to category
+
+        Returns:
+            Number of duplicate transactions skipped, per source file
+        """
+        count, skipped = self.ledger.append(transactions, categories)
+        logger.info(f"Appended {count} transactions to {self.ledger.db_path.name}")
+
+        if count:
+            self._export_wanted.set()
+
+        skipped_by_source: Dict[str, int] = {}
+        for row in skipped:
+            source = row[7]
+            skipped_by_source[source] = skipped_by_source.get(source, 0) + 1
+            logger.debug(
+                f"Duplicate skipped: {display_date(row[0])} {row[2]} {row[3]} "
+                f"(card {row[1]}, {source})"
+            )
+
+        if skipped:
+            logger.warning(
+                f"Skipped {len(skipped)} transactions already in the ledger "
+                f"(overlapping statements)"
+            )
+
+        return skipped_by_source
+
+    def update_categories(self, categories: Dict[str, str]) -> int:
+        """
+        Fill in the category of uncategorized rows in the ledger.
+
+        Args:
+            categories: Dictionary mapping business name to its new category
+
+        Returns:
+            Number of rows updated
+        """
+        updated = self.ledger.update_categories(categories)
+        if updated:
+            self._export_wanted.set()
+        return updated
+
+    def export(self, full: bool = True, wait: bool = True):
+        """
+        Regenerate the master file from the ledger.
+
+        Ledger rows are streamed in chunks into write-only workbooks, so
+        memory use doesn't grow with the history. Workbooks are written to a
+        temporary file and moved into place, so a failed export never leaves
+        a half-written file.
+
+        Args:
+            full: Rewrite every partition file; otherwise only those whose
+                months changed (the single master workbook is always
+                rewritten whole)
+            wait: Wait up to file_lock_wait seconds for a locked file;
+                otherwise fail at once with FileLockedError
+
+        Raises:
+            FileLockedError: A target file is open in Excel
+        """
+        with self._export_lock:
+            self._wait_for_locks = wait
+            started = time.time()
+            dirty_months = self.ledger.dirty_months()
+
+            if self.partition == 'none':
+                self._export_single()
+            elif self.partition_files:
+                self._export_partition_files(None if full else dirty_months)
+            else:
+                self._export_partition_sheets()
+
+            self.ledger.clear_dirty(dirty_months, started)
+
+    def export_if_dirty(self, wait: bool = True) -> bool:
+        """Export the partitions changed since the last export, if any."""
+        if not self.dirty:
+            return False
+
+        self.export(full=False, wait=wait)
+        return True
+
+    def start_background_export(self, delay: float = 60, retry_interval: float = 10):
+        """
+        Export from a dedicated thread whenever the ledger changes.
+
+        Appends only write the ledger, which is the durable queue; the
+        thread waits `delay` seconds after the first change so that further
+        appends coalesce into one save. A master file held open by Excel is
+        retried every `retry_interval` seconds without blocking the callers.
+
+        Args:
+            delay: Seconds to gather changes before exporting
+            retry_interval: Seconds between attempts while a file is locked
+        """
+        if self._export_thread is not None:
+            return
+
+        self._export_stop.clear()
+        if self.dirty:
+            self._export_wanted.set()  # Left over from a previous run
+
+        self._export_thread = threading.Thread(
+            target=self._export_loop, args=(delay, retry_interval),
+            name='fincat-export', daemon=True
+        )
+        self._export_thread.start()
+
+    def stop_background_export(self):
+        """Stop the export thread (pending changes stay in the ledger)."""
+        if self._export_thread is None:
+            return
+
+        self._export_stop.set()
+        self._export_wanted.set()
+        self._export_thread.join()
+        self._export_thread = None
+
+    def _export_loop(self, delay: float, retry_interval: float):
+        """Body of the background export thread."""
+        locked_since = None
+        retrying = False
+
+        while not self._export_stop.is_set():
+            # A retry goes straight to the export; a new change first lets
+            # the appends of the next few seconds join it
+            if not retrying:
+                self._export_wanted.wait()
+                if self._export_stop.wait(delay):
+                    break
+            self._export_wanted.clear()
+            retrying = False
+
+            try:
+                self.export_if_dirty(wait=False)
+
+                if locked_since is not None:
+                    logger.info(
+                        f"Master file exported after being locked for "
+                        f"{time.time() - locked_since:.0f}s"
+                    )
+                    locked_since = None
+                continue
+
+            except FileLockedError:
+                if locked_since is None:
+                    logger.warning(
+                        f"Master file is locked (Excel is open), retrying every "
+                        f"{retry_interval}s in the background"
+                    )
+                    locked_since = time.time()
+
+            except Exception as e:
+                logger.error(f"Background export failed: {e}", exc_info=True)
+
+            if self._export_stop.wait(retry_interval):
+                break
+            retrying = True
+
+    def _export_single(self):
+        """Write every transaction to one sheet of the master file."""
+        self._ensure_available(self.master_file)
+        wb, ws = self._create_new_workbook()
+
+        count = 0
+        for row in self.ledger.iter_rows():
+            ws.append(self._export_row(row))
+            count += 1
+
+        self._save(wb, self.master_file)
+        logger.info(f"Exported {count} transactions to {self.master_file}")
+
+    def _export_partition_sheets(self):
+        """Write one sheet per period, after an index sheet, to the master file."""
+        self._ensure_available(self.master_file)
+        summary = self.ledger.period_summary(PARTITION_KEY_LENGTHS[self.partition])
+
+        wb, _ = self._create_new_workbook(index=True)
+        self._write_index(wb, summary, location='sheet')
+
+        periods = sorted({period for period, _, _, _ in summary})
+        for period in periods:
+            ws = self._create_transactions_sheet(wb, title=period)
+            for row in self.ledger.iter_rows(period):
+                ws.append(self._export_row(row))
+
+        self._save(wb, self.master_file)
+        logger.info(f"Exported {len(periods)} {self.partition} sheets to {self.master_file}")
+
+    def _export_partition_files(self, dirty_months: Optional[set]):
         """
-        # Wait for file to be available
-        if not self._wait_for_file_available():
+        Write one file per period and an index master file.
+
+        Args:
+            dirty_months: Months to refresh (None = all periods)
+        """
+        self._ensure_available(self.master_file)
+        length = PARTITION_KEY_LENGTHS[self.partition]
+        summary = self.ledger.period_summary(length)
+        periods = sorted({period for period, _, _, _ in summary})
+
+        if dirty_months is not None:
+            changed = {month[:length] for month in dirty_months}
+            periods = [
+                period for period in periods
+                if period in changed or not self._partition_file(period).exists()
+            ]
+
+        for period in periods:
+            self._ensure_available(self._partition_file(period))
+            wb, ws = self._create_new_workbook()
+            ws.title = period
+
+            count = 0
+            for row in self.ledger.iter_rows(period):
+                ws.append(self._export_row(row))
+                count += 1
+
+            self._save(wb, self._partition_file(period))
+            logger.info(f"Exported {count} transactions to {self._partition_file(period).name}")
+
+        wb, _ = self._create_new_workbook(index=True)
+        self._write_index(wb, summary, location='file')
+        self._save(wb, self.master_file)
+
+    def _partition_file(self, period: str) -> Path:
+        """Export file of one period, e.g. מעקב_חיובים_2025-11.xlsx."""
+        return self.master_file.with_name(
+            f"{self.master_file.stem}_{period}{self.master_file.suffix}"
+        )
+
+    def _write_index(self, wb, summary: List[tuple], location: str):
+        """
+        Add the index sheet listing each period's rows and totals.
+
+        Args:
+            wb: Write-only workbook (index sheet already created first)
+            summary: Rows from Ledger.period_summary()
+            location: 'sheet' or 'file', for the last column
+        """
+        ws = wb.worksheets[0]
+        ws.title = INDEX_SHEET
+
+        for period, currency, count, total in summary:
+            target = period if location == 'sheet' else self._partition_file(period).name
+            ws.append([period, currency, count, total, target])
+
+    def _ensure_available(self, path: Path):
+        """
+        Check a target file is not locked before building its workbook.
+
+        Waits up to file_lock_wait seconds unless the export was started
+        with wait=False.
+
+        Raises:
+            FileLockedError: The file is open in Excel
+        """
+        if self._wait_for_locks:
+            available = self._wait_for_file_available(path)
+        else:
+            available = not self._is_file_locked(path)
+
+        if not available:
             raise FileLockedError(
-                f"Master file '{self.master_file.name}' is locked (Excel is open). "
+                f"Master file '{path.name}' is locked (Excel is open). "
                 f"Please close Excel and try again."
             )
 
-        # Load or create workbook
-        if self.master_file.exists():
-            logger.debug(f"Loading existing master file: {self.master_file}")
-            wb = openpyxl.load_workbook(self.master_file)
-            ws = wb.active
-        else:
-            logger.info(f"Creating new master file: {self.master_file}")
-            wb, ws = self._create_new_workbook()
+    def _save(self, wb, path: Path):
+        """Save a workbook atomically once the target file is not locked."""
+        self._ensure_available(path)
 
-        # Append transactions
-        for transaction in transactions:
-            category = categories.get(transaction.business_name, 'לא סווג')
-
-            row = [
-                transaction.date.strftime('%d/%m/%Y'),
-                transaction.card,
-                transaction.business_name,
-                transaction.amount,
-                transaction.currency,
-                category,
-                transaction.installments,
-                transaction.source_filename,
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                transaction.details
-            ]
+        tmp_file = path.with_name(f".{path.stem}.tmp.xlsx")
+        wb.save(tmp_file)
+        tmp_file.replace(path)
 
-            ws.append(row)
+    @staticmethod
+    def _export_row(row: tuple) -> list:
+        """Convert a ledger row to master-file cell values."""
+        row = list(row)
+        row[0] = display_date(row[0])
+        return row
 
-        # Save
-        wb.save(self.master_file)
-        logger.info(f"Appended {len(transactions)} transactions to {self.master_file}")
+    def _create_new_workbook(self, index: bool = False):
+        """
+        Create a write-only master workbook with its first sheet.
 
-    def _create_new_workbook(self):
-        """Create new master file with headers."""
-        wb = openpyxl.Workbook()
-        ws = wb.active
+        Rows appended to a write-only sheet are streamed to a temporary file
+        instead of kept as cell objects, so memory stays flat however large
+        the ledger grows.
+
+        Args:
+            index: Start with an index sheet instead of a transactions sheet
+
+        Returns:
+            (workbook, first sheet)
+        """
+        wb = openpyxl.Workbook(write_only=True)
+
+        if index:
+            ws = wb.create_sheet()
+            ws.append(self._header_cells(ws, INDEX_HEADERS))
+            return wb, ws
+
+        return wb, self._create_transactions_sheet(wb)
+
+    def _create_transactions_sheet(self, wb, title: Optional[str] = None):
+        """Add a transactions sheet with the bold header row."""
+        ws = wb.create_sheet(title)
 
         # Headers
         headers = [
@@ -102,39 +426,52 @@ class ExcelWriter:
             'הערות'            # Notes
         ]
 
-        ws.append(headers)
-
-        # Make headers bold
-        for cell in ws[1]:
-            cell.font = openpyxl.styles.Font(bold=True)
-
-        return wb, ws
-
-    def _is_file_locked(self) -> bool:
+        ws.append(self._header_cells(ws, headers))
+        return ws
+
+    @staticmethod
+    def _header_cells(ws, headers: List[str]) -> list:
+        """Make headers bold (write-only sheets take styled cells, not ws[1])."""
+        bold = openpyxl.styles.Font(bold=True)
+        cells = []
+        for header in headers:
+            cell = WriteOnlyCell(ws, value=header)
+            cell.font = bold
+            cells.append(cell)
+        return cells
+
+    def _is_file_locked(self, path: Optional[Path] = None) -> bool:
         """
         Check if Excel file is currently open (locked).
 
+        Args:
+            path: File to check (default: the master file)
+
         Returns:
             True if locked, False if available
         """
-        if not self.master_file.exists():
+        path = path or self.master_file
+        if not path.exists():
             return False
 
         try:
             # Try to open in append mode
-            with open(self.master_file, 'a'):
+            with open(path, 'a'):
                 return False
         except (IOError, PermissionError):
             return True
 
-    def _wait_for_file_available(self) -> bool:
+    def _wait_for_file_available(self, path: Optional[Path] = None) -> bool:
         """
         Wait for file to become available (not locked).
 
+        Args:
+            path: File to wait for (default: the master file)
+
         Returns:
             True if file available, False if timeout
         """
-        if not self._is_file_locked():
+        if not self._is_file_locked(path):
             return True
 
         logger.warning(
@@ -143,7 +480,7 @@ class ExcelWriter:
         )
 
         for i in range(self.lock_wait):
-            if not self._is_file_locked():
+            if not self._is_file_locked(path):
                 logger.info("File is now available")
                 return True
 
@@ -3,8 +3,9 @@ File system monitoring using watchdog.
 """
 
 import logging
-import time
+import threading
 from pathlib import Path
+from typing import List
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
@@ -14,19 +15,33 @@ logger = logging.getLogger('fincat.file_watcher')
 
 
 class XLSFileHandler(FileSystemEventHandler):
-    """Handler for XLS/XLSX file events."""
+    """
+    Handler for XLS/XLSX file events.
+
+    New files are collected for a short window that restarts with every
+    event, then handed to the callback together, so statements dropped in
+    at once are processed as one unit.
+    """
 
     def __init__(self, callback, config):
         """
         Initialize handler.
 
         Args:
-            callback: Function to call when file detected
+            callback: Function to call with the files detected in one window
             config: Configuration dictionary
         """
         super().__init__()
         self.callback = callback
         self.stability_wait = config['processing']['file_stability_wait']
+        self.batch_window = config['processing'].get('batch_window', 3)
+
+        self._pending: List[Path] = []
+        self._timer = None
+        self._lock = threading.Lock()
+
+        # Windows never overlap: a batch waits for the previous one to finish
+        self._processing_lock = threading.Lock()
 
     def on_created(self, event):
         """Handle file creation events."""
@@ -45,13 +60,80 @@ class XLSFileHandler(FileSystemEventHandler):
 
         logger.info(f"Detected new file: {filepath.name}")
 
+        # Hold the window while this file is still being written, so files
+        # dropped in together aren't split by a slow copy
+        self._hold()
+
         # Wait for file to be fully written
         if wait_for_file_stability(filepath, check_interval=1, max_wait=self.stability_wait):
             logger.debug(f"File stable: {filepath.name}")
-            self.callback(filepath)
         else:
-            logger.warning(f"File may not be complete: {filepath.name}")
-            self.callback(filepath)  # Try anyway
+            logger.warning(f"File may not be complete: {filepath.name}")  # Try anyway
+
+        self._enqueue(filepath)
+
+    def _hold(self):
+        """Stop the window timer until the next file is enqueued."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _enqueue(self, filepath: Path):
+        """Add a file to the current window and restart the window timer."""
+        with self._lock:
+            if filepath not in self._pending:
+                self._pending.append(filepath)
+
+            if self._timer is not None:
+                self._timer.cancel()
+
+            if self.batch_window <= 0:
+                self._timer = None
+            else:
+                self._timer = threading.Timer(self.batch_window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+                return
+
+        self.flush()
+
+    def flush(self):
+        """Hand the files collected so far to the callback."""
+        with self._processing_lock:
+            with self._lock:
+                files, self._pending = self._pending, []
+                self._timer = None
+
+            if not files:
+                return
+
+            if len(files) > 1:
+                logger.info(f"Processing {len(files)} files together")
+
+            self.callback(files)
+
+    def cancel(self):
+        """
+        Stop the window timer, dropping files not yet handed over.
+
+        Waits for a batch already being processed to finish, so it is not
+        cut short between writing the ledger and archiving its files.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            if self._pending:
+                logger.info(
+                    f"{len(self._pending)} file(s) left in the input folder "
+                    f"for the next run"
+                )
+            self._pending = []
+
+        with self._processing_lock:
+            pass
 
 
 class FileWatcher:
@@ -63,7 +145,8 @@ class FileWatcher:
 
         Args:
             config: Configuration dictionary
-            callback: Function to call when file detected (receives Path)
+            callback: Function to call with newly detected files
+                (receives a list of Paths)
         """
         self.config = config
         self.input_folder = Path(config['folders']['input'])
@@ -83,7 +166,8 @@ class FileWatcher:
         logger.info(f"Monitoring folder: {self.input_folder}")
 
     def stop(self):
-        """Stop watching."""
+        """Stop watching (after the batch in progress, if any, completes)."""
         self.observer.stop()
         self.observer.join()
+        self.handler.cancel()
         logger.info("File monitoring stopped")
@@ -0,0 +1,179 @@
+"""
+Persistent cache of known statement layouts (header position and columns).
+"""
+
+import hashlib
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Tuple
+
+logger = logging.getLogger('fincat.layout_cache')
+
+
+def normalize_header_cell(value) -> str:
+    """Normalize a header cell: strip, collapse whitespace and lowercase."""
+    if value is None:
+        return ''
+    return ' '.join(str(value).strip().split()).lower()
+
+
+def layout_fingerprint(row: list, position: int, kind: str) -> str:
+    """
+    Fingerprint a candidate header row.
+
+    Args:
+        row: Raw cell values of the row
+        position: Row index within the sheet
+        kind: File kind ('xls' or 'xlsx'), since each has its own rules
+
+    Returns:
+        Hex digest identifying the layout
+    """
+    cells = [normalize_header_cell(value) for value in row]
+
+    # Trailing empty cells vary between exports of the same layout
+    while cells and not cells[-1]:
+        cells.pop()
+
+    key = json.dumps([kind, position, cells], ensure_ascii=False)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+class LayoutCache:
+    """
+    Map header-row fingerprints to the column map found for them.
+
+    A statement from an issuer we've already seen resolves to its cached
+    header index and column map with a single dictionary lookup, so only
+    unknown layouts go through the full header search.
+
+    Parser worker processes use a cache that doesn't write to disk: the
+    layouts they learn are handed back to the parent (take_learned), which
+    is the only process saving the file.
+    """
+
+    def __init__(self, data_folder: Path, version: str = '', persist: bool = True):
+        """
+        Initialize layout cache.
+
+        Args:
+            data_folder: Data folder path (cache file lives here)
+            version: Tag of the header matching rules; entries recorded
+                under a different tag are ignored
+            persist: Save new layouts to disk (False in worker processes)
+        """
+        self.cache_file = Path(data_folder) / '.layout_cache.json'
+        self.version = version
+        self.persist = persist
+        self.hits = 0
+        self.misses = 0
+        self.layouts = self._load()
+
+        # Layouts learned but not saved (persist=False)
+        self.learned = {}
+
+    def _load(self) -> dict:
+        """Load cached layouts from disk."""
+        if not self.cache_file.exists():
+            return {}
+
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable layout cache {self.cache_file.name}: {e}")
+            return {}
+
+        if data.get('version') != self.version:
+            logger.info("Header matching rules changed, starting a new layout cache")
+            return {}
+
+        return data.get('layouts', {})
+
+    def _save(self):
+        """Write cache to disk atomically."""
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.cache_file.with_suffix('.tmp')
+
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(
+                {'version': self.version, 'layouts': self.layouts},
+                f, ensure_ascii=False, indent=2
+            )
+
+        tmp_file.replace(self.cache_file)
+
+    def lookup(self, fingerprint: str) -> Optional[dict]:
+        """
+        Look up a column map by fingerprint (does not touch counters).
+
+        Args:
+            fingerprint: Value from layout_fingerprint()
+
+        Returns:
+            Column map dictionary, or None if unknown
+        """
+        entry = self.layouts.get(fingerprint)
+        if entry is None:
+            return None
+        return dict(entry['col_map'])
+
+    def store(self, fingerprint: str, col_map: dict, header_row_idx: int):
+        """
+        Remember the column map for a newly detected layout.
+
+        Args:
+            fingerprint: Value from layout_fingerprint()
+            col_map: Column type to index mapping
+            header_row_idx: Row index of the header
+        """
+        entry = {
+            'col_map': col_map,
+            'header_row_idx': header_row_idx,
+            'learned_at': datetime.now().isoformat()
+        }
+        self.layouts[fingerprint] = entry
+
+        if not self.persist:
+            self.learned[fingerprint] = entry
+            return
+
+        self._try_save()
+
+    def take_learned(self) -> dict:
+        """Return the layouts learned since the last call, and forget them."""
+        learned, self.learned = self.learned, {}
+        return learned
+
+    def merge(self, layouts: dict):
+        """
+        Add layouts learned by another process and save them.
+
+        Args:
+            layouts: Entries returned by that process's take_learned()
+        """
+        if not layouts:
+            return
+
+        self.layouts.update(layouts)
+        self._try_save()
+
+    def _try_save(self):
+        """Save the cache, logging (not raising) I/O errors."""
+        try:
+            self._save()
+        except OSError as e:
+            logger.warning(f"Could not save layout cache: {e}")
+
+    def record(self, hit: bool):
+        """Count one file as a cache hit or miss."""
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self) -> Tuple[int, int]:
+        """Return (hits, misses) counted by this instance."""
+        return self.hits, self.misses
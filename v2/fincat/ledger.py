@@ -0,0 +1,570 @@
+"""
+Append-only transaction ledger (SQLite in the data folder).
+"""
+
+import hashlib
+import json
+import logging
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import openpyxl
+
+from .normalizer import MerchantNormalizer
+from .parser import EPOCH, TransactionBatch
+
+logger = logging.getLogger('fincat.ledger')
+
+UNCATEGORIZED = 'לא סווג'
+
+# Title of the index sheet of a partitioned master file
+INDEX_SHEET = 'אינדקס'
+
+# Suffix of the copies kept of master files that predate the ledger
+BACKUP_SUFFIX = '.pre-ledger'
+
+# Ledger columns, in master-file column order (after the id)
+COLUMNS = ('date', 'card', 'business_name', 'amount', 'currency', 'category',
+           'installments', 'source', 'processed_at', 'details')
+
+
+def _iso_date(value) -> str:
+    """Convert a master-file date cell (DD/MM/YYYY text or datetime) to YYYY-MM-DD."""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d')
+
+    text = str(value).strip()
+    try:
+        return datetime.strptime(text, '%d/%m/%Y').strftime('%Y-%m-%d')
+    except ValueError:
+        return text
+
+
+def dedup_key(row: tuple, normalize) -> str:
+    """
+    Identity of a transaction across overlapping statements.
+
+    Args:
+        row: Ledger row (COLUMNS order)
+        normalize: Function mapping a business name to its canonical key
+
+    Returns:
+        Hex digest of (date, card, amount, normalized business, installments)
+    """
+    date, card, business_name, amount = row[0], row[1], row[2], row[3]
+    installments = row[6]
+
+    try:
+        amount = f"{float(amount):.2f}"
+    except (TypeError, ValueError):
+        amount = str(amount)
+
+    key = '\x1f'.join([
+        date, str(card or ''), amount, normalize(str(business_name)), str(installments or '')
+    ])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def display_date(iso_date: str) -> str:
+    """Format a ledger date (YYYY-MM-DD) the way the master file shows it (DD/MM/YYYY)."""
+    if len(iso_date) == 10 and iso_date[4] == '-' and iso_date[7] == '-':
+        return f"{iso_date[8:10]}/{iso_date[5:7]}/{iso_date[0:4]}"
+    return iso_date
+
+
+class Ledger:
+    """
+    Primary store of every processed transaction.
+
+    Appending a statement inserts its rows in one SQLite transaction, so the
+    cost depends on the statement, not on the size of the history. The
+    master Excel file is an export of the ledger. Rows are never deleted;
+    the only update is filling in the category of 'לא סווג' rows.
+    """
+
+    def __init__(self, config: dict):
+        """
+        Open (or create) the ledger, importing the master file the first time.
+
+        Args:
+            config: Configuration dictionary
+        """
+        data_folder = Path(config['folders']['data'])
+        data_folder.mkdir(parents=True, exist_ok=True)
+
+        self.db_path = data_folder / config['excel'].get('ledger_file', 'ledger.db')
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY,
+                date TEXT NOT NULL,
+                card TEXT,
+                business_name TEXT NOT NULL,
+                amount REAL,
+                currency TEXT,
+                category TEXT NOT NULL,
+                installments TEXT,
+                source TEXT,
+                processed_at TEXT,
+                details TEXT
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_transactions_uncategorized "
+            "ON transactions (business_name) WHERE category = 'לא סווג'"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date)"
+        )
+
+        # Duplicate detection: rows of overlapping statements share a key;
+        # occurrence numbers identical rows within one statement
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(transactions)")}
+        if 'dedup_key' not in columns:
+            self._conn.execute("ALTER TABLE transactions ADD COLUMN dedup_key TEXT")
+            self._conn.execute("ALTER TABLE transactions ADD COLUMN occurrence INTEGER")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_transactions_dedup "
+            "ON transactions (dedup_key, occurrence)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+
+        # Months (YYYY-MM) changed since the master file was last exported
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dirty_months "
+            "(month TEXT PRIMARY KEY, changed_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+        self.deduplicate = config['excel'].get('deduplicate', True)
+        self.normalizer = MerchantNormalizer(config)
+
+        master_file = data_folder / config['excel']['master_file']
+        if master_file.exists() and not len(self):
+            self.import_master_file(master_file)
+
+        # Keys depend on the normalization settings; rebuild when they change
+        self.dedup_version = hashlib.sha1(json.dumps(
+            config.get('normalization', {}), sort_keys=True, ensure_ascii=False
+        ).encode('utf-8')).hexdigest()[:12]
+        if self._meta('dedup_version') != self.dedup_version:
+            self.rebuild_dedup_index()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+    def _meta(self, name: str) -> Optional[str]:
+        """Read a ledger metadata value."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def append(self, transactions, categories: Dict[str, str]) -> Tuple[int, List[tuple]]:
+        """
+        Append transactions with their categories, skipping duplicates.
+
+        A row is a duplicate when the ledger already holds its n-th
+        occurrence: two identical coffees in one statement are both kept,
+        but the same two coffees in an overlapping statement are skipped.
+
+        Args:
+            transactions: TransactionBatch or list of Transaction objects
+            categories: Dictionary mapping business name to category
+
+        Returns:
+            (number of rows appended, skipped duplicate rows)
+        """
+        rows = list(self._build_rows(transactions, categories))
+        keyed = self._with_keys(rows)
+
+        skipped = []
+        if self.deduplicate and keyed:
+            known = self._known_keys({(key, occurrence) for *_, key, occurrence in keyed})
+            fresh = []
+            for row in keyed:
+                identity = row[-2:]
+                if identity in known:
+                    skipped.append(row[:len(COLUMNS)])
+                else:
+                    known.add(identity)  # Also catches overlaps within this append
+                    fresh.append(row)
+            keyed = fresh
+
+        self._insert(keyed)
+
+        logger.debug(f"Appended {len(keyed)} transactions to the ledger, skipped {len(skipped)}")
+        return len(keyed), skipped
+
+    def _with_keys(self, rows: List[tuple]) -> List[tuple]:
+        """Add (dedup key, occurrence within its source file) to each row."""
+        occurrences = Counter()
+        keyed = []
+
+        for row in rows:
+            key = dedup_key(row, self.normalizer.normalize)
+            occurrences[(row[7], key)] += 1
+            keyed.append(tuple(row) + (key, occurrences[(row[7], key)]))
+
+        return keyed
+
+    def _known_keys(self, identities: set, chunk_size: int = 400) -> set:
+        """Return the (key, occurrence) pairs already in the ledger."""
+        keys = sorted({key for key, _ in identities})
+        known = set()
+
+        with self._lock:
+            for start in range(0, len(keys), chunk_size):
+                chunk = keys[start:start + chunk_size]
+                known.update(self._conn.execute(
+                    f"SELECT dedup_key, occurrence FROM transactions "
+                    f"WHERE dedup_key IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                ))
+
+        return known & identities
+
+    def _insert(self, rows: List[tuple]):
+        """Insert keyed rows and mark their months dirty, in one SQLite transaction."""
+        now = time.time()
+        months = {(row[0][:7], now) for row in rows}
+        columns = COLUMNS + ('dedup_key', 'occurrence')
+
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    f"INSERT INTO transactions ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' * len(columns))})",
+                    rows
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO dirty_months (month, changed_at) VALUES (?, ?)",
+                    months
+                )
+
+    def _build_rows(self, transactions, categories: Dict[str, str]):
+        """
+        Yield ledger rows for transactions.
+
+        Batches are read column by column: the category of each distinct
+        business and the text of each distinct date are resolved once
+        instead of once per row.
+        """
+        processed_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        if not isinstance(transactions, TransactionBatch):
+            for transaction in transactions:
+                yield (
+                    transaction.date.strftime('%Y-%m-%d'),
+                    transaction.card,
+                    transaction.business_name,
+                    transaction.amount,
+                    transaction.currency,
+                    categories.get(transaction.business_name, UNCATEGORIZED),
+                    transaction.installments,
+                    transaction.source_filename,
+                    processed_at,
+                    transaction.details
+                )
+            return
+
+        batch = transactions
+        business_categories = [
+            categories.get(name, UNCATEGORIZED) for name in batch.business_name.values
+        ]
+        date_texts = {}
+
+        for i in range(len(batch)):
+            seconds = batch.dates[i]
+            date_text = date_texts.get(seconds)
+            if date_text is None:
+                date_text = (EPOCH + timedelta(seconds=seconds)).strftime('%Y-%m-%d')
+                date_texts[seconds] = date_text
+
+            business_code = batch.business_name.codes[i]
+
+            yield (
+                date_text,
+                batch.card[i],
+                batch.business_name.values[business_code],
+                batch.amounts[i],
+                batch.currency[i],
+                business_categories[business_code],
+                batch.installments[i],
+                batch.source_filename[i],
+                processed_at,
+                batch.details[i]
+            )
+
+    def update_categories(self, categories: Dict[str, str]) -> int:
+        """
+        Fill in the category of uncategorized rows.
+
+        Args:
+            categories: Dictionary mapping business name to its new category
+
+        Returns:
+            Number of rows updated
+        """
+        updates = [
+            (category, name) for name, category in categories.items()
+            if category != UNCATEGORIZED
+        ]
+
+        now = time.time()
+
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO dirty_months (month, changed_at) "
+                    "SELECT DISTINCT substr(date, 1, 7), ? FROM transactions "
+                    "WHERE business_name = ? AND category = 'לא סווג'",
+                    [(now, name) for _, name in updates]
+                )
+                cursor = self._conn.executemany(
+                    "UPDATE transactions SET category = ? "
+                    "WHERE business_name = ? AND category = 'לא סווג'",
+                    updates
+                )
+                updated = cursor.rowcount
+
+        if updated:
+            logger.info(f"Updated {updated} uncategorized rows in the ledger")
+        return updated
+
+    def iter_rows(self, period: str = '', chunk_size: int = 5000) -> Iterator[Tuple]:
+        """
+        Yield rows in insertion order, in master-file column order.
+
+        Rows are fetched in chunks so the full history is never in memory.
+
+        Args:
+            period: Only rows dated in this year (YYYY) or month (YYYY-MM);
+                all rows if empty
+            chunk_size: Rows fetched per query round trip
+        """
+        query = f"SELECT {', '.join(COLUMNS)} FROM transactions"
+        params = ()
+        if period:
+            # Range on the date index; dates are YYYY-MM-DD text
+            query += " WHERE date >= ? AND date < ?"
+            params = (period, period + '~')
+        query += " ORDER BY id"
+
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+            rows = cursor.fetchmany(chunk_size)
+
+        while rows:
+            yield from rows
+            with self._lock:
+                rows = cursor.fetchmany(chunk_size)
+
+    def period_summary(self, length: int = 7) -> List[Tuple[str, str, int, float]]:
+        """
+        Row counts and amount totals per period and currency.
+
+        Args:
+            length: Period key length (7 = month YYYY-MM, 4 = year YYYY)
+
+        Returns:
+            Rows of (period, currency, row count, total amount), by period
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT substr(date, 1, ?), currency, COUNT(*), ROUND(SUM(amount), 2) "
+                "FROM transactions GROUP BY 1, 2 ORDER BY 1, 2",
+                (length,)
+            ).fetchall()
+
+    def dirty_months(self) -> set:
+        """Months (YYYY-MM) changed since they were last exported."""
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT month FROM dirty_months")}
+
+    def mark_dirty(self, months=None):
+        """
+        Mark months as needing export.
+
+        Args:
+            months: Months (YYYY-MM) to mark; every month in the ledger if None
+        """
+        now = time.time()
+
+        with self._lock:
+            with self._conn:
+                if months is None:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO dirty_months (month, changed_at) "
+                        "SELECT DISTINCT substr(date, 1, 7), ? FROM transactions",
+                        (now,)
+                    )
+                else:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO dirty_months (month, changed_at) VALUES (?, ?)",
+                        [(month, now) for month in months]
+                    )
+
+    def clear_dirty(self, months, exported_at: float):
+        """
+        Record that months have been exported.
+
+        Months changed again after the export started stay dirty.
+
+        Args:
+            months: Months (YYYY-MM) now up to date in the export
+            exported_at: time.time() when the export started
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "DELETE FROM dirty_months WHERE month = ? AND changed_at < ?",
+                    [(month, exported_at) for month in months]
+                )
+
+    def rebuild_dedup_index(self, chunk_size: int = 5000) -> int:
+        """
+        Recompute the duplicate-detection key of every row (bulk scan).
+
+        Runs once for a ledger created before deduplication existed (its
+        rows came from the master file) and whenever the normalization
+        settings change. Existing duplicates are kept; only new appends
+        are checked against the keys.
+
+        Returns:
+            Number of rows scanned
+        """
+        logger.info("Building the duplicate-detection index over the ledger...")
+
+        occurrences = Counter()
+        last_id = 0
+        scanned = 0
+
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT id, {', '.join(COLUMNS)} FROM transactions "
+                    f"WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, chunk_size)
+                ).fetchall()
+
+            if not rows:
+                break
+
+            updates = []
+            for row_id, *row in rows:
+                key = dedup_key(row, self.normalizer.normalize)
+                occurrences[(row[7], key)] += 1
+                updates.append((key, occurrences[(row[7], key)], row_id))
+
+            with self._lock:
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE transactions SET dedup_key = ?, occurrence = ? WHERE id = ?",
+                        updates
+                    )
+
+            last_id = rows[-1][0]
+            scanned += len(rows)
+
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (name, value) VALUES ('dedup_version', ?)",
+                    (self.dedup_version,)
+                )
+
+        logger.info(f"Indexed {scanned} ledger rows for duplicate detection")
+        return scanned
+
+    def business_categories(self) -> List[Tuple[str, str]]:
+        """Return the distinct (business name, category) pairs in the ledger."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT DISTINCT business_name, category FROM transactions"
+            ).fetchall()
+
+    def import_master_file(self, master_file: Path) -> int:
+        """
+        Load the rows of an existing master file (one-time migration).
+
+        A partitioned export is read back too: every sheet but the index,
+        and the per-period files next to the master file. Only the ledger
+        columns are imported, and the next export rewrites the files, so
+        each one is first copied to e.g. מעקב_חיובים.pre-ledger.xlsx to
+        keep extra sheets, columns and formulas.
+
+        Args:
+            master_file: Master tracking workbook
+
+        Returns:
+            Number of rows imported
+        """
+        logger.info(f"Importing existing master file into the ledger: {master_file.name}")
+
+        files = [master_file] + sorted(
+            path for path in
+            master_file.parent.glob(f"{master_file.stem}_*{master_file.suffix}")
+            if not path.stem.endswith(BACKUP_SUFFIX)
+        )
+
+        rows = []
+        for filepath in files:
+            backup = filepath.with_name(f"{filepath.stem}{BACKUP_SUFFIX}{filepath.suffix}")
+            if not backup.exists():
+                shutil.copy2(filepath, backup)
+                logger.warning(
+                    f"Backed up {filepath.name} to {backup.name}: the master file "
+                    f"will be regenerated from the ledger"
+                )
+
+            wb = openpyxl.load_workbook(filepath, read_only=True)
+            try:
+                for ws in wb.worksheets:
+                    if ws.title != INDEX_SHEET:
+                        rows.extend(self._import_rows(ws))
+            finally:
+                wb.close()
+
+        self._insert(self._with_keys(rows))
+
+        logger.info(f"Imported {len(rows)} transactions from {master_file.name}")
+        return len(rows)
+
+    @staticmethod
+    def _import_rows(ws) -> Iterator[tuple]:
+        """Yield ledger rows from a master-file transactions sheet."""
+        for row in ws.iter_rows(min_row=2, values_only=True):
+            row = (tuple(row) + (None,) * len(COLUMNS))[:len(COLUMNS)]
+            if row[0] is None or not row[2]:
+                continue
+
+            yield (
+                _iso_date(row[0]),
+                row[1],
+                str(row[2]),
+                row[3],
+                row[4],
+                str(row[5] or UNCATEGORIZED),
+                row[6],
+                row[7],
+                str(row[8]) if row[8] is not None else None,
+                row[9]
+            )
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -5,17 +5,23 @@ Main entry point and orchestration for FinCat.
 import argparse
 import logging
 import sys
+import threading
 import time
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
+from typing import List, Optional, Tuple
 
 from .config import load_config
 from .logger import setup_logging
 from .file_watcher import FileWatcher
-from .parser import ExcelParser
+from .parser import ExcelParser, TransactionBatch
 from .categorizer import Categorizer
+from .deferred_queue import DeferredQueue
 from .excel_writer import ExcelWriter
 from .file_archiver import archive_file
+from .usage import print_usage_report
 from .utils import (
+    IngestedFile,
     is_already_processed,
     mark_as_processed,
     load_processing_history,
@@ -24,107 +30,341 @@ from .utils import (
 
 logger = logging.getLogger('fincat.main')
 
+# Parser owned by each worker process in parallel manual mode
+_worker_parser = None
 
-def process_file(filepath: Path, config: dict, parser: ExcelParser,
-                 categorizer: Categorizer, writer: ExcelWriter) -> bool:
+
+def _init_parse_worker(config: dict):
+    """Set up logging and a parser inside a worker process."""
+    global _worker_parser
+
+    # Spawned workers start without handlers; forked ones inherit them
+    if not logging.getLogger('fincat').handlers:
+        setup_logging(config)
+
+    # Only the parent writes the layout cache file
+    _worker_parser = ExcelParser(config, persist_layouts=False)
+
+
+def _parse_in_worker(filepath: Path, contents: bytes) -> Tuple[TransactionBatch, dict]:
+    """
+    Parse one file in a worker process.
+
+    Returns:
+        (parsed batch, layouts learned while parsing it), pickled back to
+        the parent
+    """
+    transactions = _worker_parser.parse_batch(filepath, contents)
+    return transactions, _worker_parser.layout_cache.take_learned()
+
+
+def _read_file(filepath: Path, config: dict, parser: ExcelParser,
+               ingested: Optional[IngestedFile] = None,
+               parsed: Optional[Future] = None) -> Optional[Tuple[TransactionBatch, str]]:
     """
-    Process a single file through the pipeline.
+    Read a file and parse its transactions, unless it was already processed.
 
     Args:
         filepath: Path to the file to process
         config: Configuration dictionary
         parser: ExcelParser instance
+        ingested: File already read into memory (default: read it here)
+        parsed: Future of a worker process already parsing this file
+            (default: parse here)
+
+    Returns:
+        (parsed transactions, file checksum), or None if the file was
+        processed before
+
+    Raises:
+        Exception: Any read or parse error (the caller archives the file)
+    """
+    # Read the file once for both the checksum and the parser
+    if ingested is None:
+        ingested = IngestedFile(filepath)
+
+    # Check if already processed
+    data_folder = Path(config['folders']['data'])
+    history = load_processing_history(data_folder)
+
+    if is_already_processed(filepath, history, checksum=ingested.checksum):
+        logger.info(f"Skipping {filepath.name} (already processed)")
+        return None
+
+    # Parse Excel file (or collect the batch a worker parsed)
+    if parsed is not None:
+        transactions, layouts = parsed.result()
+        parser.layout_cache.merge(layouts)
+    else:
+        transactions = parser.parse_batch(filepath, ingested.contents)
+
+    return transactions, ingested.checksum
+
+
+def _finish_file(filepath: Path, config: dict, transactions: TransactionBatch,
+                 checksum: str, categories: dict, start_time: float,
+                 duplicates: int = 0):
+    """
+    Record a file written to the master file as processed and archive it.
+
+    Args:
+        filepath: Path to the file being processed
+        config: Configuration dictionary
+        transactions: Parsed transactions of the file
+        checksum: File checksum for the processing history
+        categories: Dictionary mapping business name to category
+        start_time: When processing of the file started
+        duplicates: Transactions skipped as already recorded
+    """
+    # Mark as processed (before archiving, so file still exists)
+    data_folder = Path(config['folders']['data'])
+    mark_as_processed(filepath, data_folder, len(transactions),
+                      checksum=checksum)
+
+    # Archive file
+    processed_folder = Path(config['folders']['processed'])
+    archive_file(filepath, processed_folder, success=True)
+
+    # Calculate stats
+    duration = time.time() - start_time
+    business_names = transactions.unique_business_names()
+    categorized_count = sum(
+        1 for name in business_names if categories.get(name, "לא סווג") != "לא סווג"
+    )
+    accuracy = (categorized_count / len(business_names) * 100) if business_names else 0
+
+    duplicates_text = f" ({duplicates} duplicates skipped)" if duplicates else ""
+
+    logger.info(
+        f"✅ Processed {filepath.name}: {len(transactions)} transactions{duplicates_text}, "
+        f"{categorized_count}/{len(business_names)} businesses categorized ({accuracy:.0f}%), "
+        f"{duration:.1f}s"
+    )
+
+
+def _fail_file(filepath: Path, config: dict, error: Exception):
+    """Log a failed file, move it to the errors folder and write an error log."""
+    logger.error(f"❌ Failed to process {filepath.name}: {error}", exc_info=error)
+
+    # Move to errors folder
+    processed_folder = Path(config['folders']['processed'])
+    archive_file(filepath, processed_folder, success=False)
+
+    # Create error log
+    error_log = processed_folder / 'errors' / f"{filepath.stem}_error.txt"
+    error_log.write_text(f"Error processing {filepath.name}:\n{str(error)}\n")
+
+
+def process_files(files: List[Path], config: dict, parser: ExcelParser,
+                  categorizer: Categorizer, writer: ExcelWriter,
+                  workers: int = 1) -> int:
+    """
+    Process several files as one unit.
+
+    All files are parsed first. Their businesses are then categorized
+    together, so a merchant appearing in every monthly statement costs one
+    lookup and batches are filled across files. Finally all transactions are
+    appended to the ledger in a single transaction, in file order. If either
+    shared step fails, the files are retried one at a time.
+
+    Args:
+        files: Paths of the files to process (processed in this order)
+        config: Configuration dictionary
+        parser: ExcelParser instance
         categorizer: Categorizer instance
         writer: ExcelWriter instance
+        workers: Number of parser processes (1 = parse in this process)
 
     Returns:
-        True if successful, False otherwise
+        Number of files processed successfully
     """
     start_time = time.time()
-    logger.info(f"Processing {filepath.name}...")
-
+    workers = min(workers, len(files))
+    pool = None
+    ingested = {}
+    parsed = {}
+
+    if workers > 1:
+        # Parse in worker processes; the parent reads each file once and
+        # ships the bytes, so the checksum and the parser share one read
+        logger.info(f"Parsing with {workers} worker processes")
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_parse_worker,
+            initargs=(config,)
+        )
+        for filepath in files:
+            try:
+                ingested[filepath] = IngestedFile(filepath)
+            except OSError:
+                continue  # _read_file retries the read and reports the error
+
+            parsed[filepath] = pool.submit(
+                _parse_in_worker, filepath, ingested[filepath].contents
+            )
+
+    # Stage 1: parse every pending file
+    pending = []
+    success_count = 0
+    try:
+        for filepath in files:
+            logger.info(f"Reading {filepath.name}...")
+            try:
+                result = _read_file(filepath, config, parser,
+                                    ingested=ingested.pop(filepath, None),
+                                    parsed=parsed.get(filepath))
+            except Exception as e:
+                _fail_file(filepath, config, e)
+                continue
+
+            if result is None:
+                success_count += 1  # Already processed
+            elif not result[0]:
+                logger.warning(f"No transactions found in {filepath.name}")
+            else:
+                pending.append((filepath, *result))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if not pending:
+        return success_count
+
+    # Stages 2-4 for all files together; if a shared stage fails, retry
+    # file by file so one bad statement (or a passing error) doesn't send
+    # every file of the batch to the errors folder
     try:
-        # Check if already processed
-        data_folder = Path(config['folders']['data'])
-        history = load_processing_history(data_folder)
+        return success_count + _write_files(pending, config, categorizer, writer, start_time)
+    except Exception as e:
+        if len(pending) == 1:
+            _fail_file(pending[0][0], config, e)
+            return success_count
+
+        logger.warning(f"Processing {len(pending)} files together failed ({e}), "
+                       f"retrying each file on its own")
+
+    for entry in pending:
+        try:
+            success_count += _write_files([entry], config, categorizer, writer, start_time)
+        except Exception as e:
+            _fail_file(entry[0], config, e)
 
-        if is_already_processed(filepath, history):
-            logger.info(f"Skipping {filepath.name} (already processed)")
-            return True
+    return success_count
 
-        # Parse Excel file
-        transactions = parser.parse(filepath)
-        if not transactions:
-            logger.warning(f"No transactions found in {filepath.name}")
-            return False
 
-        logger.info(f"Parsed {len(transactions)} transactions from {filepath.name}")
+def _write_files(pending: List[tuple], config: dict, categorizer: Categorizer,
+                 writer: ExcelWriter, start_time: float) -> int:
+    """
+    Categorize parsed files together, append them to the ledger and archive them.
 
-        # Categorize transactions
-        categories = categorizer.categorize_transactions(transactions)
+    Args:
+        pending: (filepath, transactions, checksum) of each parsed file
+        config: Configuration dictionary
+        categorizer: Categorizer instance
+        writer: ExcelWriter instance
+        start_time: When processing of the files started
 
-        # Write to master file
-        writer.append_transactions(transactions, categories)
+    Returns:
+        Number of files archived successfully
 
-        # Mark as processed (before archiving, so file still exists)
-        mark_as_processed(filepath, data_folder, len(transactions))
+    Raises:
+        Exception: Categorization or the ledger append failed (no file
+            has been archived yet)
+    """
+    combined = TransactionBatch.concat(transactions for _, transactions, _ in pending)
 
-        # Archive file
-        processed_folder = Path(config['folders']['processed'])
-        archive_file(filepath, processed_folder, success=True)
+    # Stage 2: one categorization pass over all files
+    categories = categorizer.categorize_transactions(combined)
 
-        # Calculate stats
-        duration = time.time() - start_time
-        categorized_count = sum(1 for cat in categories.values() if cat != "לא סווג")
-        accuracy = (categorized_count / len(transactions) * 100) if transactions else 0
+    # Stage 3: one ledger append for all files
+    duplicates = writer.append_transactions(combined, categories)
+
+    # Stage 4: record and archive each file
+    success_count = 0
+    for filepath, transactions, checksum in pending:
+        try:
+            _finish_file(filepath, config, transactions, checksum,
+                         categories, start_time,
+                         duplicates=duplicates.get(filepath.name, 0))
+            success_count += 1
+        except Exception as e:
+            _fail_file(filepath, config, e)
+
+    return success_count
 
-        logger.info(
-            f"✅ Processed {filepath.name}: {len(transactions)} transactions, "
-            f"{categorized_count}/{len(transactions)} categorized ({accuracy:.0f}%), "
-            f"{duration:.1f}s"
-        )
 
-        return True
+def retry_deferred(categorizer: Categorizer, writer: ExcelWriter):
+    """
+    Re-categorize businesses queued during an API outage and patch their rows.
 
+    Args:
+        categorizer: Categorizer instance
+        writer: ExcelWriter instance
+    """
+    try:
+        resolved = categorizer.recategorize_deferred()
+        if resolved:
+            writer.update_categories(resolved)
+            categorizer.deferred.remove_many(resolved)
     except Exception as e:
-        logger.error(f"❌ Failed to process {filepath.name}: {e}", exc_info=True)
+        logger.error(f"Failed to update deferred categories: {e}")
 
-        # Move to errors folder
-        processed_folder = Path(config['folders']['processed'])
-        archive_file(filepath, processed_folder, success=False)
 
-        # Create error log
-        error_log = processed_folder / 'errors' / f"{filepath.stem}_error.txt"
-        error_log.write_text(f"Error processing {filepath.name}:\n{str(e)}\n")
+def export_master(writer: ExcelWriter):
+    """
+    Regenerate the master file if the ledger changed (errors are logged).
+
+    Args:
+        writer: ExcelWriter instance
+    """
+    try:
+        writer.export_if_dirty()
+    except Exception as e:
+        logger.error(
+            f"Master file not updated: {e} "
+            f"(transactions are saved in the ledger and will be exported later)"
+        )
 
-        return False
 
+def process_all_files(config: dict, workers: int = 1):
+    """
+    Process all files in input folder once (manual mode).
 
-def process_all_files(config: dict):
-    """Process all files in input folder once (manual mode)."""
+    Args:
+        config: Configuration dictionary
+        workers: Number of parser processes (1 = parse in this process)
+    """
     input_folder = Path(config['folders']['input'])
 
-    # Find all XLS/XLSX files
-    files = list(input_folder.glob('*.xls')) + list(input_folder.glob('*.xlsx'))
+    # Find all XLS/XLSX files (sorted, so results are written in a stable order)
+    files = sorted(list(input_folder.glob('*.xls')) + list(input_folder.glob('*.xlsx')))
 
-    if not files:
+    if files:
+        logger.info(f"Found {len(files)} file(s) to process")
+    else:
         logger.info("No files to process in input folder")
-        return
 
-    logger.info(f"Found {len(files)} file(s) to process")
+        # Still drain the deferred queue, if anything is waiting
+        deferred = DeferredQueue(Path(config['folders']['data']))
+        waiting = len(deferred)
+        deferred.close()
+        if not waiting:
+            return
 
     # Initialize components
     parser = ExcelParser(config)
     categorizer = Categorizer(config)
     writer = ExcelWriter(config)
 
-    # Process each file
-    success_count = 0
-    for filepath in files:
-        if process_file(filepath, config, parser, categorizer, writer):
-            success_count += 1
+    if files:
+        success_count = process_files(files, config, parser, categorizer, writer,
+                                      workers=workers)
+        logger.info(f"Processed {success_count}/{len(files)} files successfully")
+
+    # Fix rows left uncategorized by earlier outages, if the API is up
+    retry_deferred(categorizer, writer)
 
-    logger.info(f"Processed {success_count}/{len(files)} files successfully")
+    export_master(writer)
 
 
 def watch_folder(config: dict):
@@ -138,23 +378,49 @@ def watch_folder(config: dict):
     categorizer = Categorizer(config)
     writer = ExcelWriter(config)
 
-    # Define callback
-    def on_file_detected(filepath: Path):
-        process_file(filepath, config, parser, categorizer, writer)
+    # File batches and deferred re-categorization both write the master file
+    pipeline_lock = threading.Lock()
+    retry_interval = config['ai'].get('circuit_breaker', {}).get('retry_interval', 300)
+
+    # Define callback (files arriving within the batch window come together)
+    def on_files_detected(files: List[Path]):
+        start_time = time.time()
+        with pipeline_lock:
+            success_count = process_files(files, config, parser, categorizer, writer)
+        if len(files) > 1:
+            logger.info(
+                f"Processed {success_count}/{len(files)} files successfully "
+                f"({time.time() - start_time:.1f}s)"
+            )
 
     # Start file watcher
-    watcher = FileWatcher(config, on_file_detected)
+    watcher = FileWatcher(config, on_files_detected)
+
+    # The master file is exported from its own thread, so a file left open
+    # in Excel never holds up parsing and categorization
+    writer.start_background_export(
+        delay=config['excel'].get('export_interval', 60),
+        retry_interval=config['excel'].get('export_retry_interval', 10)
+    )
 
     try:
         watcher.start()
 
-        # Keep main thread alive
+        # Keep main thread alive, periodically retrying deferred businesses
+        next_retry = time.time()
         while True:
             time.sleep(1)
 
+            if time.time() >= next_retry:
+                with pipeline_lock:
+                    retry_deferred(categorizer, writer)
+                next_retry = time.time() + retry_interval
+
     except KeyboardInterrupt:
         logger.info("\nStopping FinCat...")
         watcher.stop()
+        writer.stop_background_export()
+        export_master(writer)
         logger.info("FinCat stopped")
 
 
@@ -169,6 +435,23 @@ def main():
         action='store_true',
         help='Process all files once and exit (default: watch mode)'
     )
+    parser.add_argument(
+        '--export',
+        action='store_true',
+        help='Regenerate the master Excel file from the ledger and exit'
+    )
+    parser.add_argument(
+        '--usage',
+        action='store_true',
+        help='Print API token usage and cost report and exit'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        metavar='N',
+        help='Parse files in N parallel processes in manual mode (default: 1)'
+    )
     parser.add_argument(
         '--config',
         default='config/config.yaml',
@@ -190,9 +473,13 @@ def main():
         logger.info("FinCat v1.0.0 - Hebrew Credit Card Automation")
 
         # Run in appropriate mode
-        if args.manual:
+        if args.export:
+            ExcelWriter(config).export()
+        elif args.usage:
+            print_usage_report(config)
+        elif args.manual:
             logger.info("Running in manual mode (process once)")
-            process_all_files(config)
+            process_all_files(config, workers=args.workers)
         else:
             logger.info("Running in watch mode (continuous)")
             watch_folder(config)
@@ -0,0 +1,153 @@
+"""
+Persistent business name → category cache (SQLite in the data folder).
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+logger = logging.getLogger('fincat.merchant_cache')
+
+UNCATEGORIZED = 'לא סווג'
+
+
+class MerchantCache:
+    """
+    Remember categories assigned to businesses across runs.
+
+    Entries carry the model that produced them, the version of the category
+    list they were chosen from, and timestamps. Entries older than the TTL
+    or made against a different category list are treated as misses, and
+    the least recently used entries are evicted beyond max_entries.
+    """
+
+    def __init__(self, data_folder: Path, model: str, categories: List[str],
+                 ttl_days: float = 180, max_entries: int = 20000):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            data_folder: Data folder path (database lives here)
+            model: Model name recorded with new entries
+            categories: Current category list (entries from other lists are stale)
+            ttl_days: Entry lifetime in days (0 = never expire)
+            max_entries: Maximum entries kept (0 = unbounded)
+        """
+        self.db_path = Path(data_folder) / '.merchant_cache.db'
+        self.model = model
+        self.categories_version = hashlib.sha1(
+            '\n'.join(categories).encode('utf-8')
+        ).hexdigest()[:12]
+        self.ttl_seconds = ttl_days * 24 * 3600
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS merchants (
+                business_name TEXT PRIMARY KEY,
+                category TEXT NOT NULL,
+                model TEXT NOT NULL,
+                categories_version TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_merchants_last_used ON merchants (last_used_at)"
+        )
+        self._conn.commit()
+
+    def get_many(self, business_names: Iterable[str]) -> Dict[str, str]:
+        """
+        Look up cached categories.
+
+        Args:
+            business_names: Business names to look up
+
+        Returns:
+            Dictionary mapping business name to category for valid hits only
+        """
+        now = time.time()
+        oldest = now - self.ttl_seconds if self.ttl_seconds else 0
+        hits = {}
+
+        with self._lock:
+            for name in business_names:
+                row = self._conn.execute(
+                    "SELECT category, categories_version, created_at "
+                    "FROM merchants WHERE business_name = ?",
+                    (name,)
+                ).fetchone()
+
+                if row is None:
+                    continue
+
+                category, version, created_at = row
+                if version != self.categories_version or created_at < oldest:
+                    continue
+
+                hits[name] = category
+
+            if hits:
+                self._conn.executemany(
+                    "UPDATE merchants SET last_used_at = ? WHERE business_name = ?",
+                    [(now, name) for name in hits]
+                )
+                self._conn.commit()
+
+        return hits
+
+    def put_many(self, categories: Dict[str, str]):
+        """
+        Store newly assigned categories (uncategorized results are skipped).
+
+        Args:
+            categories: Dictionary mapping business name to category
+        """
+        now = time.time()
+        rows = [
+            (name, category, self.model, self.categories_version, now, now)
+            for name, category in categories.items()
+            if category != UNCATEGORIZED
+        ]
+
+        if not rows:
+            return
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO merchants "
+                "(business_name, category, model, categories_version, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Drop least recently used entries beyond max_entries."""
+        if not self.max_entries:
+            return
+
+        count = self._conn.execute("SELECT COUNT(*) FROM merchants").fetchone()[0]
+        excess = count - self.max_entries
+
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM merchants WHERE business_name IN ("
+                "SELECT business_name FROM merchants ORDER BY last_used_at LIMIT ?)",
+                (excess,)
+            )
+            logger.debug(f"Evicted {excess} least recently used cache entries")
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
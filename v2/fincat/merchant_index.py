@@ -0,0 +1,143 @@
+"""
+Character n-gram similarity index over previously categorized merchants.
+"""
+
+import logging
+import math
+from collections import Counter, defaultdict
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger('fincat.merchant_index')
+
+# Categories that say nothing about a merchant and are not propagated
+UNINFORMATIVE_CATEGORIES = {'לא סווג', 'אחר'}
+
+
+def char_ngrams(text: str, n: int = 3) -> Counter:
+    """Count character n-grams of text, padded so word edges form n-grams too."""
+    padded = f" {text} "
+    if len(padded) <= n:
+        return Counter([padded])
+    return Counter(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+class MerchantIndex:
+    """
+    Find the most similar known merchant by TF-IDF cosine over n-grams.
+
+    The index is an inverted file: each n-gram maps to the merchants that
+    contain it, so a query only scores merchants sharing at least one
+    n-gram with it. Merchants can be added at any time; document norms
+    depend on IDF and are recomputed lazily on the next lookup.
+    """
+
+    def __init__(self, n: int = 3):
+        """
+        Initialize an empty index.
+
+        Args:
+            n: N-gram length in characters
+        """
+        self.n = n
+        self.categories: Dict[str, str] = {}
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.doc_grams: Dict[str, Counter] = {}
+        self.norms: Dict[str, float] = {}
+        self._norms_dirty = False
+
+    def __len__(self) -> int:
+        return len(self.categories)
+
+    def add(self, key: str, category: str):
+        """
+        Add or update a merchant.
+
+        Args:
+            key: Canonical merchant key
+            category: Its category (uncertain categories are ignored)
+        """
+        if category in UNINFORMATIVE_CATEGORIES:
+            return
+
+        self.categories[key] = category
+
+        if key in self.doc_grams:
+            return
+
+        grams = char_ngrams(key, self.n)
+        self.doc_grams[key] = grams
+        for gram, count in grams.items():
+            self.postings[gram][key] = count
+
+        self._norms_dirty = True
+
+    def _idf(self, gram: str) -> float:
+        """Smoothed inverse document frequency of an n-gram."""
+        df = len(self.postings.get(gram, ()))
+        return math.log((len(self.doc_grams) + 1) / (df + 1)) + 1
+
+    def _refresh_norms(self):
+        """Recompute TF-IDF vector norms after the index changed."""
+        idf = {gram: self._idf(gram) for gram in self.postings}
+        self.norms = {
+            key: math.sqrt(sum((count * idf[gram]) ** 2 for gram, count in grams.items()))
+            for key, grams in self.doc_grams.items()
+        }
+        self._norms_dirty = False
+
+    def nearest(self, key: str) -> Optional[Tuple[str, str, float]]:
+        """
+        Find the most similar known merchant.
+
+        Args:
+            key: Canonical merchant key
+
+        Returns:
+            (neighbour key, its category, cosine similarity), or None if no
+            merchant shares an n-gram with the key
+        """
+        if not self.doc_grams:
+            return None
+
+        if self._norms_dirty:
+            self._refresh_norms()
+
+        scores: Dict[str, float] = defaultdict(float)
+        query_norm = 0.0
+
+        for gram, count in char_ngrams(key, self.n).items():
+            idf = self._idf(gram)
+            weight = count * idf
+            query_norm += weight ** 2
+
+            for doc, doc_count in self.postings.get(gram, {}).items():
+                scores[doc] += weight * doc_count * idf
+
+        if not scores:
+            return None
+
+        best = max(scores, key=scores.get)
+        similarity = scores[best] / (math.sqrt(query_norm) * self.norms[best])
+        return best, self.categories[best], similarity
+
+    @classmethod
+    def from_ledger(cls, ledger, normalize, n: int = 3) -> 'MerchantIndex':
+        """
+        Build an index from the businesses already in the ledger.
+
+        Args:
+            ledger: Ledger instance
+            normalize: Function mapping a business name to its canonical key
+            n: N-gram length in characters
+
+        Returns:
+            MerchantIndex (empty if nothing was recorded yet)
+        """
+        index = cls(n)
+
+        for business, category in ledger.business_categories():
+            if business and category:
+                index.add(normalize(str(business)), str(category))
+
+        logger.info(f"Indexed {len(index)} known merchants from {ledger.db_path.name}")
+        return index
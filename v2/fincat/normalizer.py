@@ -0,0 +1,120 @@
+"""
+Merchant name normalization (canonical keys for categorization).
+"""
+
+import logging
+import re
+from typing import Dict, List
+
+logger = logging.getLogger('fincat.normalizer')
+
+# Hebrew points and cantillation marks
+NIQQUD_RE = re.compile('[\\u0591-\\u05C7]')
+
+# Final letter forms folded to their regular forms
+FINAL_LETTERS = str.maketrans('ךםןףץ', 'כמנפצ')
+
+# Punctuation that separates name parts in issuer exports
+PUNCTUATION_RE = re.compile(r'[\*\-_.,:;/\\|#()\[\]"\'׳״]+')
+
+DIGITS_RE = re.compile(r'\d+')
+
+# Payment processor / wallet prefixes
+DEFAULT_PREFIXES = [
+    'paypal', 'פייפאל', 'sq', 'sumup', 'ביט', 'פייבוקס', 'paybox',
+    'הוראת קבע', 'הו"ק',
+]
+
+# City and branch suffixes
+DEFAULT_SUFFIXES = [
+    'תל אביב', 'ת"א', 'רמת אביב', 'ירושלים', 'י-ם', 'חיפה',
+    'באר שבע', 'ב"ש', 'ראשון לציון', 'ראשל"צ', 'פתח תקווה', 'פ"ת', 'נתניה',
+    'רמת גן', 'גבעתיים', 'הרצליה', 'רעננה', 'כפר סבא', 'הוד השרון',
+    'אשדוד', 'אשקלון', 'חולון', 'בת ים', 'רחובות', 'מודיעין', 'סניף', 'בעמ',
+    'בע"מ', 'ltd', 'israel', 'il',
+]
+
+
+def fold_hebrew(text: str) -> str:
+    """Lowercase, drop niqqud and fold Hebrew final letters."""
+    return NIQQUD_RE.sub('', text.lower()).translate(FINAL_LETTERS)
+
+
+class MerchantNormalizer:
+    """
+    Map raw business names to canonical merchant keys.
+
+    "שופרסל דיל 123 חיפה" and "שופרסל דיל 456" both become "שופרסל דיל", so
+    categorization (and its cache) sees one merchant. Canonical keys are for
+    lookups only; the original names are kept for output.
+    """
+
+    def __init__(self, config: dict):
+        """
+        Initialize normalizer from the optional 'normalization' config section.
+
+        Args:
+            config: Configuration dictionary
+        """
+        settings = config.get('normalization', {})
+
+        self.enabled = settings.get('enabled', True)
+        self.strip_digits = settings.get('strip_digits', True)
+
+        prefixes = DEFAULT_PREFIXES + list(settings.get('prefixes') or [])
+        suffixes = DEFAULT_SUFFIXES + list(settings.get('suffixes') or [])
+
+        # Extra regexes removed from the (folded) name, e.g. terminal IDs
+        self.patterns = [re.compile(p) for p in settings.get('patterns') or []]
+
+        self.prefix_re = self._compile_affixes(prefixes, r'^(?:{})\s+')
+        self.suffix_re = self._compile_affixes(suffixes, r'(?:\s+(?:{}))+$')
+
+        self._memo: Dict[str, str] = {}
+
+    @staticmethod
+    def _compile_affixes(affixes: List[str], template: str):
+        """Compile affixes (folded and cleaned like names) into one regex."""
+        cleaned = set()
+        for affix in affixes:
+            affix = ' '.join(PUNCTUATION_RE.sub(' ', fold_hebrew(affix)).split())
+            if affix:
+                cleaned.add(affix)
+
+        alternatives = sorted(cleaned, key=len, reverse=True)
+        return re.compile(template.format('|'.join(re.escape(a) for a in alternatives)))
+
+    def normalize(self, name: str) -> str:
+        """
+        Return the canonical key for a business name.
+
+        Args:
+            name: Business name as it appears on the statement
+
+        Returns:
+            Canonical merchant key
+        """
+        if not self.enabled:
+            return name
+
+        key = self._memo.get(name)
+        if key is not None:
+            return key
+
+        folded = fold_hebrew(name)
+
+        for pattern in self.patterns:
+            folded = pattern.sub(' ', folded)
+
+        text = PUNCTUATION_RE.sub(' ', folded)
+        if self.strip_digits:
+            text = DIGITS_RE.sub(' ', text)
+        text = ' '.join(text.split())
+
+        text = self.prefix_re.sub('', text)
+        text = self.suffix_re.sub('', text)
+
+        # Never collapse a name to nothing (e.g. a merchant called "1234")
+        key = text or ' '.join(folded.split())
+        self._memo[name] = key
+        return key
@@ -2,15 +2,22 @@
 Excel file parsing for Hebrew credit card statements.
 """
 
+import hashlib
 import logging
+import re
+import sys
+from array import array
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta
+from io import BytesIO
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional
 
 import xlrd
 import openpyxl
 
+from .layout_cache import LayoutCache, layout_fingerprint, normalize_header_cell
+
 logger = logging.getLogger('fincat.parser')
 
 
@@ -27,37 +34,370 @@ class Transaction:
     source_filename: str
 
 
+# Naive epoch used for the int64 date column (statements carry no timezone)
+EPOCH = datetime(1970, 1, 1)
+
+STRING_COLUMNS = ('card', 'business_name', 'currency', 'installments',
+                  'details', 'source_filename')
+
+
+class StringColumn:
+    """Dictionary-encoded string column (interned values + int32 codes)."""
+
+    __slots__ = ('values', 'codes', '_lookup')
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes = array('i')
+        self._lookup = {}
+
+    def append(self, value: str):
+        """Append a value, reusing the existing code if already seen."""
+        code = self._lookup.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(sys.intern(value))
+            self._lookup[value] = code
+        self.codes.append(code)
+
+    def __getitem__(self, index: int) -> str:
+        return self.values[self.codes[index]]
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getstate__(self):
+        # The lookup table is rebuilt on load, so pickles stay compact
+        return self.values, self.codes
+
+    def __setstate__(self, state):
+        self.values, self.codes = state
+        self._lookup = {value: code for code, value in enumerate(self.values)}
+
+
+class TransactionRow:
+    """Lightweight read-only view of one row in a TransactionBatch."""
+
+    __slots__ = ('_batch', '_index')
+
+    def __init__(self, batch: 'TransactionBatch', index: int):
+        self._batch = batch
+        self._index = index
+
+    @property
+    def date(self) -> datetime:
+        return EPOCH + timedelta(seconds=self._batch.dates[self._index])
+
+    @property
+    def amount(self) -> float:
+        return self._batch.amounts[self._index]
+
+    @property
+    def card(self) -> str:
+        return self._batch.card[self._index]
+
+    @property
+    def business_name(self) -> str:
+        return self._batch.business_name[self._index]
+
+    @property
+    def currency(self) -> str:
+        return self._batch.currency[self._index]
+
+    @property
+    def installments(self) -> str:
+        return self._batch.installments[self._index]
+
+    @property
+    def details(self) -> str:
+        return self._batch.details[self._index]
+
+    @property
+    def source_filename(self) -> str:
+        return self._batch.source_filename[self._index]
+
+    def to_transaction(self) -> Transaction:
+        """Materialize this row as a standalone Transaction."""
+        return Transaction(
+            date=self.date,
+            card=self.card,
+            business_name=self.business_name,
+            amount=self.amount,
+            currency=self.currency,
+            installments=self.installments,
+            details=self.details,
+            source_filename=self.source_filename
+        )
+
+    def __repr__(self) -> str:
+        return f"TransactionRow({self.to_transaction()!r})"
+
+
+class TransactionBatch:
+    """
+    Columnar, array-backed collection of transactions.
+
+    Amounts are stored as float64, dates as int64 seconds since EPOCH and
+    the string fields as dictionary-encoded columns, so repeated values
+    like card, currency and source filename are stored once per batch.
+    Iterating yields TransactionRow views with the same attributes as
+    Transaction, so code written against List[Transaction] keeps working.
+    """
+
+    def __init__(self):
+        self.dates = array('q')
+        self.amounts = array('d')
+        self.card = StringColumn()
+        self.business_name = StringColumn()
+        self.currency = StringColumn()
+        self.installments = StringColumn()
+        self.details = StringColumn()
+        self.source_filename = StringColumn()
+
+    @classmethod
+    def from_transactions(cls, transactions: Iterable) -> 'TransactionBatch':
+        """
+        Build a batch from Transaction objects (or rows of another batch).
+
+        Args:
+            transactions: Iterable of Transaction-like objects
+
+        Returns:
+            New TransactionBatch
+        """
+        batch = cls()
+        batch.extend(transactions)
+        return batch
+
+    @classmethod
+    def concat(cls, batches: Iterable['TransactionBatch']) -> 'TransactionBatch':
+        """Concatenate several batches into a new one, preserving order."""
+        result = cls()
+        for batch in batches:
+            result.extend(batch)
+        return result
+
+    def append(self, transaction):
+        """Append one Transaction-like object."""
+        self.dates.append((transaction.date - EPOCH) // timedelta(seconds=1))
+        self.amounts.append(transaction.amount)
+        for name in STRING_COLUMNS:
+            getattr(self, name).append(getattr(transaction, name))
+
+    def extend(self, transactions: Iterable):
+        """Append every Transaction-like object from an iterable."""
+        for transaction in transactions:
+            self.append(transaction)
+
+    def unique_business_names(self) -> List[str]:
+        """Return distinct business names without scanning the rows."""
+        return list(self.business_name.values)
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def __getitem__(self, index: int) -> TransactionRow:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('TransactionBatch index out of range')
+        return TransactionRow(self, index)
+
+    def __iter__(self) -> Iterator[TransactionRow]:
+        for index in range(len(self)):
+            yield TransactionRow(self, index)
+
+    def __repr__(self) -> str:
+        return f"TransactionBatch({len(self)} transactions)"
+
+
+# Possible column names (Hebrew and English) for each column type
+HEADER_ALIASES = {
+    'date': ['תאריך', 'תאריך עסקה', 'date'],
+    'card': ['כרטיס', 'מספר כרטיס', '4 ספרות', 'card'],
+    'business': ['שם העסק', 'עסק', 'שם בית העסק', 'business', 'business name'],
+    'amount': ['סכום', 'סכום עסקה', 'סכום חיוב', 'סכום העסקה', 'amount'],
+    'currency': ['מטבע', 'מט"ח', 'currency'],
+    'details': ['פרטים', 'פרטים נוספים', 'פירוט', 'הערות', 'details', 'notes']
+}
+
+
+class HeaderMatcher:
+    """
+    Match header cells to column types with one compiled regex.
+
+    All aliases are compiled into a single alternation, longest first, so
+    the leftmost and most specific alias in a cell decides its type (e.g.
+    "תאריך עסקה" is a date column, not a business column). Results are
+    memoized per normalized cell text.
+    """
+
+    MAX_MEMO = 4096
+
+    def __init__(self, aliases: Dict[str, List[str]] = None):
+        """
+        Initialize matcher.
+
+        Args:
+            aliases: Column type to alias list (default: HEADER_ALIASES)
+        """
+        self._aliases: Dict[str, str] = {}
+        self._memo: Dict[str, Optional[str]] = {}
+        self._pattern = None
+
+        for col_type, names in (aliases or HEADER_ALIASES).items():
+            self._add(col_type, names)
+        self._compile()
+
+    def _add(self, col_type: str, names: List[str]):
+        """Add aliases without recompiling (first registration wins)."""
+        for name in names:
+            normalized = normalize_header_cell(name)
+            if normalized:
+                self._aliases.setdefault(normalized, col_type)
+
+    def _compile(self):
+        """Compile the alias table into one alternation."""
+        alternatives = sorted(self._aliases, key=len, reverse=True)
+        self._pattern = re.compile('|'.join(re.escape(a) for a in alternatives))
+        self._memo.clear()
+
+    def register_aliases(self, col_type: str, names: List[str]):
+        """
+        Register extra aliases for a column type.
+
+        Args:
+            col_type: Column type ('date', 'card', 'business', ...)
+            names: Header texts that identify this column
+        """
+        self._add(col_type, names)
+        self._compile()
+
+    @property
+    def signature(self) -> str:
+        """Stable tag of the alias table (used to version cached layouts)."""
+        table = sorted(self._aliases.items())
+        return hashlib.sha1(repr(table).encode('utf-8')).hexdigest()[:12]
+
+    def match(self, cell_value) -> Optional[str]:
+        """
+        Return the column type of a header cell.
+
+        Args:
+            cell_value: Raw header cell value
+
+        Returns:
+            Column type, or None if the cell matches no alias
+        """
+        if cell_value is None:
+            return None
+
+        normalized = normalize_header_cell(cell_value)
+        if normalized in self._memo:
+            return self._memo[normalized]
+
+        match = self._pattern.search(normalized)
+        col_type = self._aliases[match.group(0)] if match else None
+
+        if len(self._memo) >= self.MAX_MEMO:
+            self._memo.clear()
+        self._memo[normalized] = col_type
+        return col_type
+
+
 class ExcelParser:
     """Parse XLS and XLSX files containing Hebrew credit card statements."""
 
-    def __init__(self, config: dict):
-        """Initialize parser with configuration."""
+    def __init__(self, config: dict, persist_layouts: bool = True):
+        """
+        Initialize parser with configuration.
+
+        Args:
+            config: Configuration dictionary
+            persist_layouts: Save newly learned layouts to the cache file
+                (False in worker processes, whose layouts the parent saves)
+        """
         self.config = config
 
-    def parse(self, filepath: Path) -> List[Transaction]:
+        # Issuer-specific header names from config are compiled in once
+        self.header_matcher = HeaderMatcher()
+        extra_aliases = config.get('parser', {}).get('header_aliases') or {}
+        for col_type, names in extra_aliases.items():
+            self.header_matcher.register_aliases(col_type, names)
+
+        self.layout_cache = LayoutCache(
+            Path(config['folders']['data']),
+            version=self.header_matcher.signature,
+            persist=persist_layouts
+        )
+
+    def parse(self, filepath: Path, contents: bytes = None) -> List[Transaction]:
         """
         Parse XLS or XLSX file.
 
         Args:
             filepath: Path to Excel file
+            contents: File bytes already in memory (default: read filepath)
 
         Returns:
             List of Transaction objects
         """
+        transactions = list(self.iter_transactions(filepath, contents))
+
+        file_type = 'XLS' if filepath.suffix.lower() == '.xls' else 'XLSX'
+        logger.info(f"Parsed {len(transactions)} transactions from {filepath.name} ({file_type})")
+        return transactions
+
+    def parse_batch(self, filepath: Path, contents: bytes = None) -> TransactionBatch:
+        """
+        Parse XLS or XLSX file into a columnar TransactionBatch.
+
+        Args:
+            filepath: Path to Excel file
+            contents: File bytes already in memory (default: read filepath)
+
+        Returns:
+            TransactionBatch with all parsed transactions
+        """
+        batch = TransactionBatch.from_transactions(self.iter_transactions(filepath, contents))
+
+        file_type = 'XLS' if filepath.suffix.lower() == '.xls' else 'XLSX'
+        logger.info(f"Parsed {len(batch)} transactions from {filepath.name} ({file_type})")
+        return batch
+
+    def iter_transactions(self, filepath: Path, contents: bytes = None) -> Iterator[Transaction]:
+        """
+        Stream transactions from an XLS or XLSX file row by row.
+
+        Rows are yielded as soon as they are read, so callers can start
+        working before the whole file has been parsed.
+
+        Args:
+            filepath: Path to Excel file (its name is used as the source)
+            contents: File bytes already in memory (default: read filepath)
+
+        Yields:
+            Transaction objects in file order
+        """
         if filepath.suffix.lower() == '.xls':
-            return self._parse_xls(filepath)
+            return self._iter_xls(filepath, contents)
         else:
-            return self._parse_xlsx(filepath)
+            return self._iter_xlsx(filepath, contents)
 
-    def _parse_xls(self, filepath: Path) -> List[Transaction]:
-        """Parse legacy .xls format using xlrd."""
+    def _iter_xls(self, filepath: Path, contents: bytes = None) -> Iterator[Transaction]:
+        """Stream legacy .xls format using xlrd (sheets loaded on demand)."""
+        workbook = None
         try:
-            workbook = xlrd.open_workbook(filepath)
+            if contents is not None:
+                workbook = xlrd.open_workbook(file_contents=contents, on_demand=True)
+            else:
+                workbook = xlrd.open_workbook(filepath, on_demand=True)
             sheet = workbook.sheet_by_index(0)
 
             # Find header row and extract card number (search first 10 rows)
-            header_row = None
+            col_map = None
             header_row_idx = 0
+            layout_hit = False
             card_number = "0000"  # Default if not found
 
             for i in range(min(10, sheet.nrows)):
@@ -65,44 +405,52 @@ class ExcelParser:
                 # Look for card number in rows like "כרטיס:1834"
                 for cell in row:
                     if isinstance(cell, str) and 'כרטיס' in cell:
-                        import re
                         match = re.search(r'(\d{4})', cell)
                         if match:
                             card_number = match.group(1)
 
+                # Known issuer layout: jump straight to the cached column map
+                fingerprint = layout_fingerprint(row, i, 'xls')
+                cached = self.layout_cache.lookup(fingerprint)
+                if cached is not None:
+                    col_map = cached
+                    header_row_idx = i
+                    layout_hit = True
+                    break
+
                 # Check if this row has column names (not empty, has Hebrew text)
                 if any(isinstance(v, str) and v.strip() and any('\u0590' <= c <= '\u05FF' for c in v) for v in row):
                     try:
-                        self._find_columns(row, require_card=False)  # Card column is optional
-                        header_row = row
+                        # Find column indices (flexible, card column is optional)
+                        col_map = self._find_columns(row, require_card=False)
                         header_row_idx = i
+                        self.layout_cache.store(fingerprint, col_map, i)
                         break
                     except ValueError:
                         continue
 
-            if header_row is None:
+            if col_map is None:
                 raise ValueError("Could not find header row with required columns")
 
-            # Find column indices (flexible)
-            col_map = self._find_columns(header_row, require_card=False)
-
-            transactions = []
+            self._record_layout(filepath, layout_hit)
 
             for row_idx in range(header_row_idx + 1, sheet.nrows):
                 try:
+                    row = sheet.row_values(row_idx)
+
                     # Extract values
-                    date_val = sheet.cell_value(row_idx, col_map['date'])
+                    date_val = row[col_map['date']]
                     # Use extracted card number or get from column if available
-                    card = card_number if 'card' not in col_map else str(sheet.cell_value(row_idx, col_map['card']))[:4]
-                    business = str(sheet.cell_value(row_idx, col_map['business']))
-                    amount = float(sheet.cell_value(row_idx, col_map['amount']))
+                    card = card_number if 'card' not in col_map else str(row[col_map['card']])[:4]
+                    business = str(row[col_map['business']])
+                    amount = float(row[col_map['amount']])
 
                     # Optional columns
-                    currency = str(sheet.cell_value(row_idx, col_map.get('currency', col_map['amount'])))
+                    currency = str(row[col_map.get('currency', col_map['amount'])])
                     if not currency or currency == str(amount):
                         currency = 'ILS'
 
-                    details = str(sheet.cell_value(row_idx, col_map.get('details', col_map['business'])))
+                    details = str(row[col_map.get('details', col_map['business'])])
 
                     # Convert Excel date
                     date = xlrd.xldate_as_datetime(date_val, workbook.datemode)
@@ -110,8 +458,7 @@ class ExcelParser:
                     # Parse installments
                     installments = self._parse_installments(details)
 
-                    # Create transaction
-                    transaction = Transaction(
+                    yield Transaction(
                         date=date,
                         card=card,
                         business_name=business.strip(),
@@ -122,33 +469,49 @@ class ExcelParser:
                         source_filename=filepath.name
                     )
 
-                    transactions.append(transaction)
-
                 except Exception as e:
                     logger.warning(f"Skipping row {row_idx} in {filepath.name}: {e}")
                     continue
 
-            logger.info(f"Parsed {len(transactions)} transactions from {filepath.name} (XLS)")
-            return transactions
-
         except Exception as e:
             logger.error(f"Failed to parse XLS file {filepath.name}: {e}")
             raise
 
-    def _parse_xlsx(self, filepath: Path) -> List[Transaction]:
-        """Parse modern .xlsx format using openpyxl."""
+        finally:
+            if workbook is not None:
+                workbook.release_resources()
+
+    def _iter_xlsx(self, filepath: Path, contents: bytes = None) -> Iterator[Transaction]:
+        """Stream modern .xlsx format using openpyxl in read-only mode."""
+        workbook = None
         try:
-            workbook = openpyxl.load_workbook(filepath)
+            # read_only streams rows from the sheet XML instead of building
+            # every cell (and its styles) in memory up front
+            source = BytesIO(contents) if contents is not None else filepath
+            workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
             sheet = workbook.active
-
-            # Get header row
-            header_row = [cell.value for cell in sheet[1]]
-            col_map = self._find_columns(header_row)
-
-            transactions = []
-
-            for row_idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
+            # Non-Excel exporters often write a wrong <dimension>, which
+            # read-only mode would trust and truncate rows/columns by
+            sheet.reset_dimensions()
+            rows = sheet.iter_rows(values_only=True)
+
+            # Get header row (cached column map for known layouts)
+            header_row = list(next(rows, None) or [])
+            fingerprint = layout_fingerprint(header_row, 0, 'xlsx')
+            col_map = self.layout_cache.lookup(fingerprint)
+            self._record_layout(filepath, col_map is not None)
+
+            if col_map is None:
+                col_map = self._find_columns(header_row)
+                self.layout_cache.store(fingerprint, col_map, 0)
+
+            for row_idx, row in enumerate(rows, start=2):
                 try:
+                    # Read-only rows can be shorter than the header when
+                    # trailing cells are empty
+                    if len(row) < len(header_row):
+                        row = row + (None,) * (len(header_row) - len(row))
+
                     # Extract values
                     date = row[col_map['date']]
                     card = str(row[col_map['card']])[:4]
@@ -175,8 +538,7 @@ class ExcelParser:
                     # Parse installments
                     installments = self._parse_installments(details)
 
-                    # Create transaction
-                    transaction = Transaction(
+                    yield Transaction(
                         date=date,
                         card=card,
                         business_name=business.strip(),
@@ -187,19 +549,28 @@ class ExcelParser:
                         source_filename=filepath.name
                     )
 
-                    transactions.append(transaction)
-
                 except Exception as e:
                     logger.warning(f"Skipping row {row_idx} in {filepath.name}: {e}")
                     continue
 
-            logger.info(f"Parsed {len(transactions)} transactions from {filepath.name} (XLSX)")
-            return transactions
-
         except Exception as e:
             logger.error(f"Failed to parse XLSX file {filepath.name}: {e}")
             raise
 
+        finally:
+            # Read-only workbooks keep the archive open until closed
+            if workbook is not None:
+                workbook.close()
+
+    def _record_layout(self, filepath: Path, hit: bool):
+        """Count a layout cache hit or miss for a file and log the totals."""
+        self.layout_cache.record(hit)
+        hits, misses = self.layout_cache.stats()
+        logger.debug(
+            f"Layout cache {'hit' if hit else 'miss'} for {filepath.name} "
+            f"(hits: {hits}, misses: {misses})"
+        )
+
     def _find_columns(self, header_row: list, require_card: bool = True) -> dict:
         """
         Find column indices by header names (flexible matching).
@@ -213,28 +584,10 @@ class ExcelParser:
         """
         col_map = {}
 
-        # Define possible column names (Hebrew and English)
-        column_names = {
-            'date': ['תאריך', 'תאריך עסקה', 'date'],
-            'card': ['כרטיס', 'מספר כרטיס', '4 ספרות', 'card'],
-            'business': ['שם העסק', 'שם  העסק', 'עסק', 'שם בית העסק', 'business', 'business name'],
-            'amount': ['סכום', 'סכום עסקה', 'סכום חיוב', 'סכום העסקה', 'amount'],
-            'currency': ['מטבע', 'מט"ח', 'currency'],
-            'details': ['פרטים', 'פרטים נוספים', 'פירוט', 'הערות', 'details', 'notes']
-        }
-
         for idx, cell_value in enumerate(header_row):
-            if cell_value is None:
-                continue
-
-            # Normalize: strip and collapse whitespace
-            normalized = ' '.join(str(cell_value).strip().split()).lower()
-
-            # Check each column type
-            for col_type, possible_names in column_names.items():
-                if any(name.lower() in normalized for name in possible_names):
-                    if col_type not in col_map:  # Take first match
-                        col_map[col_type] = idx
+            col_type = self.header_matcher.match(cell_value)
+            if col_type and col_type not in col_map:  # Take first match
+                col_map[col_type] = idx
 
         # Validate required columns
         required = ['date', 'business', 'amount']
@@ -258,8 +611,6 @@ class ExcelParser:
         Returns:
             Installments as "X/Y" or empty string
         """
-        import re
-
         # Look for pattern: "תשלום X מתוך Y"
         match = re.search(r'תשלום\s+(\d+)\s+מתוך\s+(\d+)', details)
         if match:
@@ -267,5 +618,3 @@ class ExcelParser:
 
         return ""
 
-
-from datetime import timedelta
@@ -0,0 +1,246 @@
+"""
+Client-side API rate limiting (requests and tokens per minute) and backoff.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+logger = logging.getLogger('fincat.rate_limiter')
+
+# One limiter per process, shared by every categorizer and request
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Read the server's Retry-After hint from an API error.
+
+    Args:
+        error: Exception raised by the API client
+
+    Returns:
+        Seconds to wait, or None if the error carries no hint
+    """
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+
+    headers = response.headers
+
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if not retry_after:
+        return None
+
+    # Either a number of seconds or an HTTP date
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def decorrelated_jitter(previous: float, base: float, cap: float) -> float:
+    """
+    Next backoff delay with decorrelated jitter.
+
+    Each delay is drawn between the base and three times the previous
+    delay, so concurrent clients that failed together retry apart.
+
+    Args:
+        previous: Previous delay in seconds (the base for the first retry)
+        base: Minimum delay in seconds
+        cap: Maximum delay in seconds
+
+    Returns:
+        Delay in seconds
+    """
+    return min(cap, random.uniform(base, max(base, previous * 3)))
+
+
+class RateLimiter:
+    """
+    Token buckets for requests per minute and input tokens per minute.
+
+    Each bucket holds up to one minute of allowance and refills
+    continuously, like the server-side limits. A request reserves its share
+    up front and is told how long to wait; reservations may overdraw a
+    bucket, which simply pushes later requests back. A server Retry-After
+    pauses every caller, not just the one that was rejected.
+    """
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        """
+        Initialize limiter.
+
+        Args:
+            requests_per_minute: Request limit (0 = unlimited)
+            tokens_per_minute: Input token limit (0 = unlimited)
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+        # Counters
+        self.requests = 0
+        self.throttled_requests = 0
+        self.throttled_seconds = 0.0
+        self.server_pauses = 0
+
+    def _refill(self, now: float):
+        """Add the allowance accrued since the last update."""
+        elapsed = now - self._updated_at
+        self._updated_at = now
+
+        if self.requests_per_minute:
+            self._requests = min(
+                self.requests_per_minute,
+                self._requests + elapsed * self.requests_per_minute / 60
+            )
+        if self.tokens_per_minute:
+            self._tokens = min(
+                self.tokens_per_minute,
+                self._tokens + elapsed * self.tokens_per_minute / 60
+            )
+
+    def reserve(self, tokens: int) -> float:
+        """
+        Reserve one request and its tokens.
+
+        Args:
+            tokens: Estimated input tokens of the request
+
+        Returns:
+            Seconds the caller must wait before sending
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+
+            wait = max(0.0, self._paused_until - now)
+
+            if self.requests_per_minute:
+                if self._requests < 1:
+                    wait = max(wait, (1 - self._requests) * 60 / self.requests_per_minute)
+                self._requests -= 1
+
+            if self.tokens_per_minute:
+                # A request larger than the bucket waits for a full bucket
+                tokens = min(tokens, self.tokens_per_minute)
+                if self._tokens < tokens:
+                    wait = max(wait, (tokens - self._tokens) * 60 / self.tokens_per_minute)
+                self._tokens -= tokens
+
+            self.requests += 1
+            if wait > 0:
+                self.throttled_requests += 1
+                self.throttled_seconds += wait
+
+            return wait
+
+    def settle(self, estimated: int, actual: int):
+        """
+        Correct the token bucket once a request's real usage is known.
+
+        Args:
+            estimated: Tokens reserved for the request
+            actual: Input tokens the server counted
+        """
+        if not self.tokens_per_minute:
+            return
+
+        with self._lock:
+            self._tokens = min(
+                self.tokens_per_minute,
+                self._tokens + min(estimated, self.tokens_per_minute) - actual
+            )
+
+    def pause(self, seconds: float):
+        """
+        Hold back every caller for a while (server asked us to slow down).
+
+        Args:
+            seconds: Pause length from now
+        """
+        with self._lock:
+            paused_until = time.monotonic() + seconds
+            if paused_until > self._paused_until:
+                self._paused_until = paused_until
+                self.server_pauses += 1
+
+    def acquire(self, tokens: int) -> float:
+        """Wait (blocking) until a request may be sent; returns the wait."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            logger.debug(f"Rate limit: waiting {wait:.1f}s")
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: int) -> float:
+        """Async variant of acquire (other batches keep running)."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            logger.debug(f"Rate limit: waiting {wait:.1f}s")
+            await asyncio.sleep(wait)
+        return wait
+
+    def stats(self) -> dict:
+        """Return counters for logging."""
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'throttled_requests': self.throttled_requests,
+                'throttled_seconds': self.throttled_seconds,
+                'server_pauses': self.server_pauses,
+            }
+
+
+def get_rate_limiter(config: dict) -> RateLimiter:
+    """
+    Return the process-wide rate limiter, creating it on first use.
+
+    Limits come from the optional 'ai.rate_limit' config section; the first
+    configuration seen wins, since all callers share one API quota.
+
+    Args:
+        config: Configuration dictionary
+
+    Returns:
+        Shared RateLimiter
+    """
+    global _shared_limiter
+
+    with _shared_lock:
+        if _shared_limiter is None:
+            settings = config['ai'].get('rate_limit', {})
+            _shared_limiter = RateLimiter(
+                requests_per_minute=settings.get('requests_per_minute', 50),
+                tokens_per_minute=settings.get('tokens_per_minute', 40000)
+            )
+        return _shared_limiter
@@ -0,0 +1,178 @@
+"""
+Offline categorization rules (keyword, prefix and regex) from a rules file.
+"""
+
+import logging
+import re
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import openpyxl
+
+logger = logging.getLogger('fincat.rules')
+
+# Rule type names accepted in the rules file (Hebrew or English)
+RULE_TYPES = {
+    'מילה': 'keyword',
+    'keyword': 'keyword',
+    'תחילית': 'prefix',
+    'prefix': 'prefix',
+    'ביטוי': 'regex',
+    'regex': 'regex',
+}
+
+# Default rules: (type, pattern, category). Earlier rules win ties, so the
+# specific "סופר פארם" comes before the generic "סופר".
+DEFAULT_RULES = [
+    ('תחילית', 'סופר פארם', 'בריאות ורפואה'),
+    ('מילה', 'פז', 'תחבורה ודלק'),
+    ('מילה', 'דלק', 'תחבורה ודלק'),
+    ('מילה', 'סונול', 'תחבורה ודלק'),
+    ('מילה', 'דור אלון', 'תחבורה ודלק'),
+    ('מילה', 'סופר', 'מזון וסופרמרקט'),
+    ('מילה', 'שופרסל', 'מזון וסופרמרקט'),
+    ('מילה', 'רמי לוי', 'מזון וסופרמרקט'),
+    ('מילה', 'ביטוח', 'ביטוח'),
+    ('מילה', 'חברת החשמל', 'חשבונות ושירותים'),
+    ('ביטוי', r'^(פנגו|סלופארק)', 'תחבורה ודלק'),
+]
+
+
+def _clean(text: str) -> str:
+    """Lowercase and collapse whitespace (names and patterns alike)."""
+    return ' '.join(str(text).lower().split())
+
+
+class RuleEngine:
+    """
+    Categorize businesses locally from user-editable rules.
+
+    Keyword and prefix rules are compiled into one regex alternation with a
+    named group per rule, so a name is matched against all of them in a
+    single search. Regex rules are compiled on their own, since inline
+    flags, named groups and backreferences don't survive being combined.
+    The earliest match in the name wins; ties go to the rule listed first.
+    """
+
+    def __init__(self, config: dict, categories: List[str]):
+        """
+        Load rules from the rules file (created with defaults if missing).
+
+        Args:
+            config: Configuration dictionary
+            categories: Valid categories (rules pointing elsewhere are skipped)
+        """
+        data_folder = Path(config['folders']['data'])
+        rules_name = config['excel'].get('rules_file', 'כללי_סיווג.xlsx')
+        self.rules_file = data_folder / rules_name
+
+        if not self.rules_file.exists():
+            logger.info(f"Creating default rules file: {self.rules_file}")
+            self._create_default_rules(self.rules_file)
+
+        self.rule_categories: List[str] = []
+        self.regex_rules: List[Tuple[int, 're.Pattern']] = []
+        self.pattern = self._compile(self._load_rules(), set(categories))
+
+    def _load_rules(self) -> List[tuple]:
+        """Read (type, pattern, category) rows from the rules file."""
+        wb = openpyxl.load_workbook(self.rules_file, read_only=True)
+        try:
+            rows = [
+                row[:3] for row in wb.active.iter_rows(min_row=2, values_only=True)
+                if len(row) >= 3 and row[1] and row[2]
+            ]
+        finally:
+            wb.close()
+
+        return rows
+
+    def _compile(self, rules: List[tuple], categories: set) -> Optional['re.Pattern']:
+        """
+        Compile keyword and prefix rules into a single alternation.
+
+        Regex rules are compiled separately into self.regex_rules.
+
+        Returns:
+            Combined pattern, or None if there are no keyword/prefix rules
+        """
+        alternatives = []
+
+        for rule_type, pattern, category in rules:
+            kind = RULE_TYPES.get(_clean(rule_type or 'keyword'))
+            category = str(category).strip()
+
+            if kind is None:
+                logger.warning(f"Unknown rule type '{rule_type}' for '{pattern}', skipping")
+                continue
+
+            if category not in categories:
+                logger.warning(f"Unknown category '{category}' in rule '{pattern}', skipping")
+                continue
+
+            if kind == 'keyword':
+                regex = rf'(?<!\w){re.escape(_clean(pattern))}(?!\w)'
+            elif kind == 'prefix':
+                regex = rf'^{re.escape(_clean(pattern))}'
+            else:
+                try:
+                    compiled = re.compile(str(pattern), re.IGNORECASE)
+                except re.error as e:
+                    logger.warning(f"Invalid regex rule '{pattern}': {e}, skipping")
+                    continue
+
+                self.regex_rules.append((len(self.rule_categories), compiled))
+                self.rule_categories.append(category)
+                continue
+
+            alternatives.append(f'(?P<r{len(self.rule_categories)}>{regex})')
+            self.rule_categories.append(category)
+
+        logger.info(f"Loaded {len(self.rule_categories)} categorization rules")
+
+        if not alternatives:
+            return None
+        return re.compile('|'.join(alternatives), re.IGNORECASE)
+
+    def match(self, business_name: str) -> Optional[str]:
+        """
+        Return the category of the first matching rule.
+
+        Args:
+            business_name: Business name as it appears on the statement
+
+        Returns:
+            Category, or None if no rule matches
+        """
+        name = _clean(business_name)
+        best = None  # (match start, rule index)
+
+        if self.pattern is not None:
+            match = self.pattern.search(name)
+            if match is not None:
+                best = (match.start(), int(match.lastgroup[1:]))
+
+        for index, regex in self.regex_rules:
+            match = regex.search(name)
+            if match is not None and (best is None or (match.start(), index) < best):
+                best = (match.start(), index)
+
+        if best is None:
+            return None
+
+        return self.rule_categories[best[1]]
+
+    def _create_default_rules(self, filepath: Path):
+        """Create default rules file."""
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+
+        wb = openpyxl.Workbook()
+        ws = wb.active
+
+        # Headers: rule type (מילה / תחילית / ביטוי), pattern, category
+        ws.append(['סוג', 'תבנית', 'קטגוריה'])
+
+        for rule in DEFAULT_RULES:
+            ws.append(rule)
+
+        wb.save(filepath)
@@ -0,0 +1,311 @@
+"""
+API token usage and cost accounting (SQLite in the data folder).
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger('fincat.usage')
+
+# USD per million tokens (claude-3-haiku); override under ai.pricing
+DEFAULT_PRICING = {
+    'input_per_mtok': 0.25,
+    'output_per_mtok': 1.25,
+    'cache_read_per_mtok': 0.03,
+    'cache_write_per_mtok': 0.30,
+}
+
+
+def source_shares(pairs: Iterable[Tuple[str, str]]) -> Dict[str, float]:
+    """
+    Split a categorization run between the files it was made for.
+
+    Each unique business counts once, divided evenly between the files it
+    appears in, so a file's share is its part of the run's businesses.
+
+    Args:
+        pairs: (business, source file) of each transaction whose business
+            is sent to the API
+
+    Returns:
+        Dictionary mapping source file to its share (shares sum to 1)
+    """
+    pairs = set(pairs)
+    files_per_business = Counter(business for business, _ in pairs)
+    if not files_per_business:
+        return {}
+
+    shares = Counter()
+    for business, source in pairs:
+        shares[source] += 1 / files_per_business[business]
+
+    return {source: share / len(files_per_business) for source, share in shares.items()}
+
+
+class UsageTracker:
+    """
+    Record every API call and enforce optional spending budgets.
+
+    Each call is stored with its tokens (input, output, cache read/written),
+    latency, estimated cost and the run it belongs to. A run is one
+    categorization pass, often over several files; runs maps each run to
+    its files and their share of it, so usage can be reported per call,
+    per file and per day.
+    """
+
+    def __init__(self, config: dict):
+        """
+        Open (or create) the usage database.
+
+        Args:
+            config: Configuration dictionary (reads ai.pricing and ai.budget)
+        """
+        self.db_path = Path(config['folders']['data']) / '.usage.db'
+        self.model = config['ai']['model']
+        self.pricing = {**DEFAULT_PRICING, **(config['ai'].get('pricing') or {})}
+
+        budget = config['ai'].get('budget', {})
+        self.run_budget = budget.get('per_run', 0)      # USD, 0 = no limit
+        self.daily_budget = budget.get('daily', 0)      # USD, 0 = no limit
+        self.monthly_budget = budget.get('monthly', 0)  # USD, 0 = no limit
+
+        # Spent by this process (one run in manual mode)
+        self.run_spent = 0.0
+        self.run_calls = 0
+
+        # Run the calls belong to (see start_run); its files are written
+        # with the first call, so runs without API calls leave no trace
+        self.run_id = ''
+        self._run_shares: Dict[str, float] = {}
+        self._budget_warned_on = None
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS calls (
+                id INTEGER PRIMARY KEY,
+                called_at REAL NOT NULL,
+                day TEXT NOT NULL,
+                source TEXT NOT NULL,
+                model TEXT NOT NULL,
+                input_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL,
+                cache_read_tokens INTEGER NOT NULL,
+                cache_write_tokens INTEGER NOT NULL,
+                latency_ms INTEGER NOT NULL,
+                cost REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_calls_day ON calls (day)")
+
+        # Databases from before runs: their calls keep the joined file names
+        # in source and are reported as they are
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(calls)")}
+        if 'run_id' not in columns:
+            self._conn.execute("ALTER TABLE calls ADD COLUMN run_id TEXT")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT NOT NULL,
+                source TEXT NOT NULL,
+                share REAL NOT NULL,
+                PRIMARY KEY (run_id, source)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_calls_run ON calls (run_id)")
+        self._conn.commit()
+
+    def start_run(self, shares: Dict[str, float]):
+        """
+        Attribute the following calls to a new run.
+
+        Args:
+            shares: Source file (or 'deferred') to its share of the run,
+                e.g. from source_shares()
+        """
+        with self._lock:
+            self.run_id = uuid.uuid4().hex
+            self._run_shares = dict(shares)
+
+    def cost(self, input_tokens: int, output_tokens: int,
+             cache_read_tokens: int = 0, cache_write_tokens: int = 0) -> float:
+        """Estimated cost in USD of the given token counts."""
+        return (
+            input_tokens * self.pricing['input_per_mtok']
+            + output_tokens * self.pricing['output_per_mtok']
+            + cache_read_tokens * self.pricing['cache_read_per_mtok']
+            + cache_write_tokens * self.pricing['cache_write_per_mtok']
+        ) / 1_000_000
+
+    def record(self, usage, latency: float):
+        """
+        Store one API call.
+
+        Args:
+            usage: Usage object of the API response
+            latency: Request duration in seconds
+        """
+        cache_read = getattr(usage, 'cache_read_input_tokens', None) or 0
+        cache_write = getattr(usage, 'cache_creation_input_tokens', None) or 0
+        cost = self.cost(usage.input_tokens, usage.output_tokens, cache_read, cache_write)
+
+        now = time.time()
+        with self._lock:
+            self.run_spent += cost
+            self.run_calls += 1
+
+            if self._run_shares:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO runs (run_id, source, share) VALUES (?, ?, ?)",
+                    [(self.run_id, source, share) for source, share in self._run_shares.items()]
+                )
+                self._run_shares = {}
+
+            self._conn.execute(
+                "INSERT INTO calls (called_at, day, source, model, input_tokens, "
+                "output_tokens, cache_read_tokens, cache_write_tokens, latency_ms, cost, "
+                "run_id) VALUES (?, ?, '', ?, ?, ?, ?, ?, ?, ?, ?)",
+                (now, datetime.fromtimestamp(now).strftime('%Y-%m-%d'), self.model,
+                 usage.input_tokens, usage.output_tokens, cache_read, cache_write,
+                 int(latency * 1000), cost, self.run_id or None)
+            )
+            self._conn.commit()
+
+    def spent(self, since_day: str) -> float:
+        """Total estimated cost in USD of calls made on or after a day (YYYY-MM-DD)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COALESCE(SUM(cost), 0) FROM calls WHERE day >= ?", (since_day,)
+            ).fetchone()
+        return row[0]
+
+    def allows(self, estimated_cost: float) -> bool:
+        """
+        Check whether a request fits within the per-run, daily and monthly budgets.
+
+        Args:
+            estimated_cost: Worst-case cost of the request in USD
+
+        Returns:
+            True if the request may be sent
+        """
+        if not (self.run_budget or self.daily_budget or self.monthly_budget):
+            return True
+
+        today = datetime.now().strftime('%Y-%m-%d')
+        exceeded = None
+
+        if self.run_budget and self.run_spent + estimated_cost > self.run_budget:
+            exceeded = f"per-run budget ${self.run_budget:.2f}"
+        elif self.daily_budget and self.spent(today) + estimated_cost > self.daily_budget:
+            exceeded = f"daily budget ${self.daily_budget:.2f}"
+        elif self.monthly_budget and \
+                self.spent(today[:8] + '01') + estimated_cost > self.monthly_budget:
+            exceeded = f"monthly budget ${self.monthly_budget:.2f}"
+
+        if exceeded is None:
+            return True
+
+        # Warn once per budget and day, not once per batch
+        if self._budget_warned_on != (today, exceeded):
+            logger.warning(f"API {exceeded} reached, categorizing locally only")
+            self._budget_warned_on = (today, exceeded)
+        return False
+
+    def daily_report(self, days: int = 30) -> List[tuple]:
+        """
+        Usage per day, most recent first.
+
+        Returns:
+            Rows of (day, calls, input, output, cache read, cache written,
+            average latency in ms, cost)
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT day, COUNT(*), SUM(input_tokens), SUM(output_tokens), "
+                "SUM(cache_read_tokens), SUM(cache_write_tokens), AVG(latency_ms), SUM(cost) "
+                "FROM calls GROUP BY day ORDER BY day DESC LIMIT ?",
+                (days,)
+            ).fetchall()
+
+    def source_report(self, limit: int = 20) -> List[tuple]:
+        """
+        Usage per source file, most recent first.
+
+        Tokens and cost of calls shared by several files are split between
+        them by their share of the run.
+
+        Returns:
+            Rows of (last call time, source, calls, input, output, cost)
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT MAX(called_at), source, COUNT(*), SUM(input_tokens), "
+                "SUM(output_tokens), SUM(cost) FROM ("
+                "  SELECT c.called_at, r.source, c.input_tokens * r.share AS input_tokens, "
+                "         c.output_tokens * r.share AS output_tokens, c.cost * r.share AS cost "
+                "  FROM calls c JOIN runs r ON r.run_id = c.run_id "
+                "  UNION ALL "
+                "  SELECT called_at, source, input_tokens, output_tokens, cost "
+                "  FROM calls WHERE run_id IS NULL"
+                ") GROUP BY source ORDER BY MAX(called_at) DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+def print_usage_report(config: dict, days: int = 30, out: Optional[object] = None):
+    """
+    Print API usage per day and per source, with budget status.
+
+    Args:
+        config: Configuration dictionary
+        days: Number of most recent days shown
+        out: Stream to print to (default: stdout)
+    """
+    tracker = UsageTracker(config)
+
+    def emit(line: str = ''):
+        print(line, file=out)
+
+    try:
+        emit(f"API usage ({tracker.db_path})")
+        emit()
+        emit(f"{'Day':<12}{'Calls':>7}{'Input':>11}{'Output':>10}"
+             f"{'Cache rd':>10}{'Cache wr':>10}{'Latency':>9}{'Cost $':>10}")
+
+        for day, calls, inp, out_, cache_read, cache_write, latency, cost in \
+                tracker.daily_report(days):
+            emit(f"{day:<12}{calls:>7}{inp:>11,}{out_:>10,}"
+                 f"{cache_read:>10,}{cache_write:>10,}{latency:>7.0f}ms{cost:>10.4f}")
+
+        emit()
+        emit("Recent files (calls shared by several files are split between them):")
+        for called_at, source, calls, inp, out_, cost in tracker.source_report():
+            when = datetime.fromtimestamp(called_at).strftime('%Y-%m-%d %H:%M')
+            emit(f"  {when}  {calls:>4} calls  {inp:>9,.0f} in  {out_:>8,.0f} out  "
+                 f"${cost:.4f}  {source or '-'}")
+
+        today = datetime.now().strftime('%Y-%m-%d')
+        emit()
+        emit(f"Today: ${tracker.spent(today):.4f}"
+             + (f" of ${tracker.daily_budget:.2f} daily budget" if tracker.daily_budget else ""))
+        emit(f"This month: ${tracker.spent(today[:8] + '01'):.4f}"
+             + (f" of ${tracker.monthly_budget:.2f} monthly budget"
+                if tracker.monthly_budget else ""))
+    finally:
+        tracker.close()
@@ -64,6 +64,38 @@ def calculate_checksum(filepath: Path) -> str:
     return sha256.hexdigest()
 
 
+class IngestedFile:
+    """
+    Input file read into memory once.
+
+    The same bytes serve the checksum (history check and history entry) and
+    the parser, so each statement costs a single read from disk.
+    """
+
+    def __init__(self, filepath: Path):
+        """
+        Read file contents.
+
+        Args:
+            filepath: Path to file
+        """
+        self.path = filepath
+        self.contents = filepath.read_bytes()
+        self._checksum = None
+
+    @property
+    def name(self) -> str:
+        """File name."""
+        return self.path.name
+
+    @property
+    def checksum(self) -> str:
+        """SHA256 hex digest of the contents (computed once)."""
+        if self._checksum is None:
+            self._checksum = hashlib.sha256(self.contents).hexdigest()
+        return self._checksum
+
+
 def load_processing_history(data_folder: Path) -> dict:
     """
     Load processing history from JSON file.
@@ -97,18 +129,20 @@ def save_processing_history(data_folder: Path, history: dict):
         json.dump(history, f, ensure_ascii=False, indent=2)
 
 
-def is_already_processed(filepath: Path, history: dict) -> bool:
+def is_already_processed(filepath: Path, history: dict, checksum: str = None) -> bool:
     """
     Check if file has already been processed.
 
     Args:
         filepath: Path to file
         history: Processing history dictionary
+        checksum: Precomputed checksum (default: read the file)
 
     Returns:
         True if already processed, False otherwise
     """
-    checksum = calculate_checksum(filepath)
+    if checksum is None:
+        checksum = calculate_checksum(filepath)
 
     processed_checksums = [
         entry['checksum'] for entry in history.get('processed_files', [])
@@ -117,7 +151,8 @@ def is_already_processed(filepath: Path, history: dict) -> bool:
     return checksum in processed_checksums
 
 
-def mark_as_processed(filepath: Path, data_folder: Path, transaction_count: int):
+def mark_as_processed(filepath: Path, data_folder: Path, transaction_count: int,
+                      checksum: str = None):
     """
     Mark file as processed in history.
 
@@ -125,12 +160,13 @@ def mark_as_processed(filepath: Path, data_folder: Path, transaction_count: int)
         filepath: Path to processed file
         data_folder: Data folder path
         transaction_count: Number of transactions processed
+        checksum: Precomputed checksum (default: read the file)
     """
     history = load_processing_history(data_folder)
 
     entry = {
         "filename": filepath.name,
-        "checksum": calculate_checksum(filepath),
+        "checksum": checksum or calculate_checksum(filepath),
         "processed_at": datetime.now().isoformat(),
         "transaction_count": transaction_count,
         "status": "success"
@@ -0,0 +1,86 @@
+"""
+Shared fixtures for the FinCat tests.
+"""
+
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_api import FakeMessagesAPI  # noqa: E402
+from fincat import rate_limiter  # noqa: E402
+from fincat.parser import Transaction  # noqa: E402
+
+
+@pytest.fixture
+def config(tmp_path):
+    """Minimal configuration with every folder under a temporary directory."""
+    return {
+        'folders': {
+            'input': str(tmp_path / 'input'),
+            'processed': str(tmp_path / 'processed'),
+            'data': str(tmp_path / 'data'),
+            'logs': str(tmp_path / 'logs'),
+        },
+        'excel': {
+            'master_file': 'מעקב_חיובים.xlsx',
+            'categories_file': 'קטגוריות.xlsx',
+            'file_lock_wait': 0,
+        },
+        'normalization': {},
+    }
+
+
+
+@pytest.fixture
+def fake_api():
+    """Fake Messages API server, stopped after the test."""
+    api = FakeMessagesAPI()
+    yield api
+    api.close()
+
+
+@pytest.fixture
+def ai_config(config, fake_api, monkeypatch):
+    """
+    Configuration pointing the categorizer at the fake API.
+
+    The cache and similar-merchant lookup are off, so every business not
+    matched by a rule reaches the API; retries back off briefly.
+    """
+    monkeypatch.setenv('ANTHROPIC_API_KEY', 'sk-ant-test')
+
+    # The rate limiter is process-wide; each test starts with its own
+    monkeypatch.setattr(rate_limiter, '_shared_limiter', None)
+
+    config['ai'] = {
+        'model': 'claude-3-haiku-20240307',
+        'base_url': fake_api.url,
+        'batch_size': 50,
+        'max_output_tokens': 4096,
+        'max_retries': 3,
+        'concurrency': 1,
+        'rate_limit': {'backoff_base': 0.01, 'backoff_cap': 0.05},
+        'circuit_breaker': {'failure_threshold': 5, 'reset_timeout': 60},
+        'cache': {'enabled': False},
+        'fuzzy': {'enabled': False},
+    }
+    return config
+
+
+def make_transaction(day: str, business_name: str, amount: float,
+                     source: str = 'statement.xlsx', card: str = '1234') -> Transaction:
+    """Build a transaction dated day (YYYY-MM-DD)."""
+    return Transaction(
+        date=datetime.strptime(day, '%Y-%m-%d'),
+        card=card,
+        business_name=business_name,
+        amount=amount,
+        currency='₪',
+        installments='',
+        details='',
+        source_filename=source
+    )
@@ -0,0 +1,128 @@
+"""
+Local stand-in for the Anthropic Messages API, served on ai.base_url.
+"""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+ERROR_TYPES = {
+    429: 'rate_limit_error',
+    500: 'api_error',
+    529: 'overloaded_error',
+}
+
+
+class FakeMessagesAPI:
+    """
+    Answer categorization requests with a tool call, like the real API.
+
+    Every business gets its category from `answers` ('אחר' if absent),
+    except businesses in `unanswered`, which replies leave out. Replies
+    queued in `script` are sent first, one per request:
+
+        {'status': 529, 'headers': {'retry-after': '0'}}   API error
+        {'omit': ['name', ...]}                            leave names out
+        {'truncate': True}                                 stop at max_tokens
+
+    Setting `fail_with` to a status code fails every request until reset.
+    """
+
+    def __init__(self, answers: Optional[Dict[str, str]] = None):
+        self.answers = answers or {}
+        self.unanswered = set()
+        self.script: List[dict] = []
+        self.fail_with = None
+
+        # Business names and arrival time of each request
+        self.requests: List[List[str]] = []
+        self.request_times: List[float] = []
+
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['content-length'])))
+                status, headers, payload = api._reply(body)
+
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('content-type', 'application/json')
+                self.send_header('content-length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        """Base URL to put under ai.base_url."""
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def close(self):
+        """Stop the server."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _reply(self, body: dict) -> tuple:
+        """Return (status, headers, JSON payload) for a request."""
+        prompt = body['messages'][-1]['content']
+        if isinstance(prompt, list):
+            prompt = ''.join(block.get('text', '') for block in prompt)
+        names = re.findall(r'^\d+\. (.+)$', prompt, re.M)
+
+        self.requests.append(names)
+        self.request_times.append(time.monotonic())
+
+        step = self.script.pop(0) if self.script else {}
+        status = step.get('status', self.fail_with)
+        if status:
+            error = {'type': 'error', 'error': {
+                'type': ERROR_TYPES.get(status, 'api_error'), 'message': 'fake error'
+            }}
+            return status, step.get('headers', {}), error
+
+        system = ''.join(block['text'] for block in body['system'])
+        categories = re.findall(
+            r'^\d+\. (.+)$', system.split('by number:')[1].split('Instructions:')[0], re.M
+        )
+
+        left_out = self.unanswered | set(step.get('omit', ()))
+        assignments = [
+            {'b': i + 1, 'c': categories.index(self.answers.get(name, 'אחר')) + 1}
+            for i, name in enumerate(names) if name not in left_out
+        ]
+
+        stop_reason = 'tool_use'
+        if step.get('truncate'):
+            assignments = assignments[:len(assignments) // 2]
+            stop_reason = 'max_tokens'
+
+        return 200, {}, {
+            'id': f"msg_{len(self.requests)}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': body['model'],
+            'content': [{
+                'type': 'tool_use',
+                'id': f"toolu_{len(self.requests)}",
+                'name': body['tool_choice']['name'],
+                'input': {'assignments': assignments},
+            }],
+            'stop_reason': stop_reason,
+            'stop_sequence': None,
+            'usage': {'input_tokens': 10 * len(names) + 100, 'output_tokens': 5 * len(names)},
+        }
@@ -0,0 +1,123 @@
+"""
+Tests for API categorization, against a fake Messages API.
+"""
+
+from conftest import make_transaction
+from fincat.categorizer import Categorizer
+
+ANSWERS = {
+    'קפה גרג': 'מסעדות ובתי קפה',
+    'ארומה': 'מסעדות ובתי קפה',
+    'נטפליקס': 'בידור ופנאי',
+    'זארה': 'קניות וביגוד',
+}
+
+
+def test_truncated_reply_is_split_and_retried(ai_config, fake_api):
+    fake_api.answers = ANSWERS
+    fake_api.script = [{'truncate': True}]
+    names = list(ANSWERS)
+
+    categories = Categorizer(ai_config).categorize_names(names)
+
+    assert categories == ANSWERS
+    assert fake_api.requests == [names, names[:2], names[2:]]
+
+
+def test_businesses_missing_from_reply_are_requested_again(ai_config, fake_api):
+    fake_api.answers = ANSWERS
+    fake_api.script = [{'omit': ['נטפליקס']}]
+    names = list(ANSWERS)
+
+    categories = Categorizer(ai_config).categorize_names(names)
+
+    assert categories == ANSWERS
+    assert fake_api.requests == [names, ['נטפליקס']]
+
+
+def test_business_never_answered_is_left_uncategorized(ai_config, fake_api):
+    fake_api.answers = ANSWERS
+    fake_api.unanswered = {'זארה'}
+
+    categories = Categorizer(ai_config).categorize_names(list(ANSWERS))
+
+    assert categories['זארה'] == 'לא סווג'
+    assert categories['ארומה'] == 'מסעדות ובתי קפה'
+    # One request per round, up to max_retries rounds
+    assert fake_api.requests[1:] == [['זארה'], ['זארה']]
+
+
+def test_retry_after_pauses_requests(ai_config, fake_api):
+    fake_api.answers = ANSWERS
+    fake_api.script = [{'status': 429, 'headers': {'retry-after': '0.3'}}]
+    categorizer = Categorizer(ai_config)
+
+    categories = categorizer.categorize_names(['קפה גרג'])
+
+    assert categories == {'קפה גרג': 'מסעדות ובתי קפה'}
+    assert len(fake_api.requests) == 2
+    assert fake_api.request_times[1] - fake_api.request_times[0] >= 0.3
+    assert categorizer.rate_limiter.stats()['server_pauses'] == 1
+    assert not categorizer.circuit.is_open
+
+
+def test_circuit_opens_and_deferred_businesses_are_recategorized(ai_config, fake_api):
+    ai_config['ai']['circuit_breaker'] = {'failure_threshold': 2, 'reset_timeout': 0}
+    fake_api.answers = ANSWERS
+    fake_api.fail_with = 529
+    categorizer = Categorizer(ai_config)
+
+    categories = categorizer.categorize_names(['קפה גרג', 'ארומה'])
+
+    # Two failures open the circuit; no third attempt is made
+    assert len(fake_api.requests) == 2
+    assert categorizer.circuit.is_open
+    assert set(categories.values()) == {'לא סווג'}
+    assert sorted(categorizer.deferred.pending()) == ['ארומה', 'קפה גרג']
+
+    fake_api.fail_with = None
+    resolved = categorizer.recategorize_deferred()
+
+    assert resolved == {'קפה גרג': 'מסעדות ובתי קפה', 'ארומה': 'מסעדות ובתי קפה'}
+    assert not categorizer.circuit.is_open
+
+    # The caller removes businesses once their rows are updated
+    categorizer.deferred.remove_many(resolved)
+    assert len(categorizer.deferred) == 0
+
+
+def test_deferred_business_is_dropped_after_max_attempts(ai_config, fake_api):
+    ai_config['ai']['circuit_breaker'] = {'max_attempts': 2}
+    fake_api.unanswered = {'עסק מסתורי'}
+    categorizer = Categorizer(ai_config)
+    categorizer.deferred.add_many(['עסק מסתורי'])
+
+    # Answered retries count; the business goes after the second one
+    assert categorizer.recategorize_deferred() == {}
+    assert categorizer.deferred.pending() == ['עסק מסתורי']
+    assert categorizer.recategorize_deferred() == {}
+    assert len(categorizer.deferred) == 0
+
+
+def test_outage_does_not_use_up_deferred_attempts(ai_config, fake_api):
+    ai_config['ai']['circuit_breaker'] = {'max_attempts': 1, 'reset_timeout': 0}
+    fake_api.fail_with = 500
+    categorizer = Categorizer(ai_config)
+    categorizer.deferred.add_many(['עסק מסתורי'])
+
+    assert categorizer.recategorize_deferred() == {}
+    assert categorizer.deferred.pending() == ['עסק מסתורי']
+
+
+def test_api_usage_is_charged_to_files_sent_to_the_api(ai_config, fake_api):
+    fake_api.answers = ANSWERS
+    categorizer = Categorizer(ai_config)
+
+    # שופרסל is matched by a default rule and never reaches the API
+    categorizer.categorize_transactions([
+        make_transaction('2025-03-01', 'שופרסל', 120.0, source='known.xlsx'),
+        make_transaction('2025-03-02', 'קפה גרג', 18.0, source='new.xlsx'),
+    ])
+
+    report = categorizer.usage.source_report()
+    assert [(source, calls) for _, source, calls, *_ in report] == [('new.xlsx', 1)]
@@ -0,0 +1,118 @@
+"""
+Tests for the master file writer and its export, plain and partitioned by period.
+"""
+
+import threading
+import time
+
+import openpyxl
+
+from conftest import make_transaction
+from fincat.excel_writer import ExcelWriter, FileLockedError
+from fincat.ledger import INDEX_SHEET
+
+CATEGORIES = {'קפה גרג': 'מסעדות ובתי קפה', 'רמי לוי': 'מזון וסופרמרקט'}
+
+TRANSACTIONS = [
+    make_transaction('2025-01-10', 'קפה גרג', 18.0),
+    make_transaction('2025-01-12', 'רמי לוי', 200.0),
+    make_transaction('2025-02-03', 'רמי לוי', 150.5),
+]
+
+
+def sheet_rows(ws) -> list:
+    """Data rows of a sheet (header skipped)."""
+    return list(ws.iter_rows(min_row=2, values_only=True))
+
+
+def test_export_single_sheet(config):
+    writer = ExcelWriter(config)
+    writer.append_transactions(TRANSACTIONS, CATEGORIES)
+
+    assert writer.export_if_dirty()
+    assert not writer.dirty
+
+    wb = openpyxl.load_workbook(writer.master_file, read_only=True)
+    rows = sheet_rows(wb.active)
+    assert [(row[0], row[2], row[5]) for row in rows] == [
+        ('10/01/2025', 'קפה גרג', 'מסעדות ובתי קפה'),
+        ('12/01/2025', 'רמי לוי', 'מזון וסופרמרקט'),
+        ('03/02/2025', 'רמי לוי', 'מזון וסופרמרקט'),
+    ]
+
+
+def test_export_partition_sheets(config):
+    config['excel']['partition'] = 'month'
+    writer = ExcelWriter(config)
+    writer.append_transactions(TRANSACTIONS, CATEGORIES)
+
+    writer.export()
+
+    wb = openpyxl.load_workbook(writer.master_file, read_only=True)
+    assert wb.sheetnames == [INDEX_SHEET, '2025-01', '2025-02']
+    assert sheet_rows(wb[INDEX_SHEET]) == [
+        ('2025-01', '₪', 2, 218, '2025-01'),
+        ('2025-02', '₪', 1, 150.5, '2025-02'),
+    ]
+    assert len(sheet_rows(wb['2025-01'])) == 2
+    assert len(sheet_rows(wb['2025-02'])) == 1
+
+
+def test_export_partition_files_rewrites_changed_periods(config):
+    config['excel']['partition'] = 'month'
+    config['excel']['partition_files'] = True
+    writer = ExcelWriter(config)
+    writer.append_transactions(TRANSACTIONS, CATEGORIES)
+    writer.export()
+
+    january = writer.master_file.with_name('מעקב_חיובים_2025-01.xlsx')
+    february = writer.master_file.with_name('מעקב_חיובים_2025-02.xlsx')
+    index = openpyxl.load_workbook(writer.master_file, read_only=True)[INDEX_SHEET]
+    assert [row[4] for row in sheet_rows(index)] == [january.name, february.name]
+
+    # Only February changes, so only its file is rewritten
+    january_written = january.stat().st_mtime_ns
+    writer.append_transactions([make_transaction('2025-02-20', 'קפה גרג', 22.0)], CATEGORIES)
+    assert writer.export_if_dirty()
+
+    assert january.stat().st_mtime_ns == january_written
+    assert len(sheet_rows(openpyxl.load_workbook(february, read_only=True).active)) == 2
+
+
+def test_append_transactions_reports_skipped_duplicates(config):
+    writer = ExcelWriter(config)
+    writer.append_transactions(TRANSACTIONS, CATEGORIES)
+
+    overlap = [
+        make_transaction('2025-02-03', 'רמי לוי', 150.5, source='overlap.xlsx'),
+        make_transaction('2025-02-09', 'קפה גרג', 21.0, source='overlap.xlsx'),
+    ]
+    skipped = writer.append_transactions(overlap, CATEGORIES)
+
+    assert skipped == {'overlap.xlsx': 1}
+    assert len(writer.ledger) == 4
+
+
+def test_background_export_retries_locked_file_without_coalescing_delay(config):
+    writer = ExcelWriter(config)
+    writer.append_transactions(TRANSACTIONS, CATEGORIES)
+
+    attempts = []
+    exported = threading.Event()
+
+    def export(full=True, wait=True):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise FileLockedError("locked")
+        exported.set()
+
+    writer.export = export
+    writer.start_background_export(delay=1.0, retry_interval=0.1)
+    try:
+        assert exported.wait(5)
+    finally:
+        writer.stop_background_export()
+
+    # The retry follows retry_interval, not delay + retry_interval
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] < 0.5
@@ -0,0 +1,126 @@
+"""
+Tests for the transaction ledger and its duplicate detection.
+"""
+
+from pathlib import Path
+
+import openpyxl
+
+from conftest import make_transaction
+from fincat.ledger import Ledger
+
+CATEGORIES = {
+    'קפה גרג': 'מסעדות ובתי קפה',
+    'רמי לוי': 'מזון וסופרמרקט',
+    'שופרסל דיל 123': 'מזון וסופרמרקט',
+    'שופרסל דיל 456': 'מזון וסופרמרקט',
+}
+
+
+def test_identical_rows_in_one_file_are_kept(config):
+    ledger = Ledger(config)
+    transactions = [
+        make_transaction('2025-03-01', 'קפה גרג', 18.0),
+        make_transaction('2025-03-01', 'קפה גרג', 18.0),
+    ]
+
+    count, skipped = ledger.append(transactions, CATEGORIES)
+
+    assert count == 2
+    assert skipped == []
+    assert len(ledger) == 2
+
+
+def test_overlapping_file_rows_are_skipped(config):
+    ledger = Ledger(config)
+    march = [
+        make_transaction('2025-03-01', 'קפה גרג', 18.0, source='march.xlsx'),
+        make_transaction('2025-03-01', 'קפה גרג', 18.0, source='march.xlsx'),
+        make_transaction('2025-03-20', 'רמי לוי', 250.0, source='march.xlsx'),
+    ]
+    ledger.append(march, CATEGORIES)
+
+    # A re-export covering the same dates plus one new transaction
+    overlap = [
+        make_transaction('2025-03-01', 'קפה גרג', 18.0, source='march_again.xlsx'),
+        make_transaction('2025-03-01', 'קפה גרג', 18.0, source='march_again.xlsx'),
+        make_transaction('2025-03-20', 'רמי לוי', 250.0, source='march_again.xlsx'),
+        make_transaction('2025-04-02', 'רמי לוי', 90.0, source='march_again.xlsx'),
+    ]
+    count, skipped = ledger.append(overlap, CATEGORIES)
+
+    assert count == 1
+    assert len(skipped) == 3
+    assert len(ledger) == 4
+
+
+def test_deduplicate_disabled_keeps_overlaps(config):
+    config['excel']['deduplicate'] = False
+    ledger = Ledger(config)
+    transaction = make_transaction('2025-03-01', 'קפה גרג', 18.0)
+
+    ledger.append([transaction], CATEGORIES)
+    count, skipped = ledger.append([transaction], CATEGORIES)
+
+    assert (count, skipped) == (1, [])
+
+
+def test_rebuild_dedup_index_after_normalization_change(config):
+    # Branch numbers are part of the key: different merchants
+    config['normalization'] = {'strip_digits': False}
+    ledger = Ledger(config)
+    ledger.append(
+        [make_transaction('2025-03-05', 'שופרסל דיל 123', 312.5, source='a.xlsx')],
+        CATEGORIES
+    )
+    old_version = ledger.dedup_version
+    ledger.close()
+
+    # Branch numbers stripped: the reopened ledger rekeys its rows, so the
+    # same purchase spelled with another branch number is a duplicate
+    config['normalization'] = {'strip_digits': True}
+    ledger = Ledger(config)
+    assert ledger.dedup_version != old_version
+
+    count, skipped = ledger.append(
+        [make_transaction('2025-03-05', 'שופרסל דיל 456', 312.5, source='b.xlsx')],
+        CATEGORIES
+    )
+
+    assert count == 0
+    assert len(skipped) == 1
+
+
+def test_update_categories_fills_uncategorized_rows(config):
+    ledger = Ledger(config)
+    ledger.append([make_transaction('2025-03-01', 'קפה גרג', 18.0)], {})
+
+    updated = ledger.update_categories({'קפה גרג': 'מסעדות ובתי קפה'})
+
+    assert updated == 1
+    assert ledger.business_categories() == [('קפה גרג', 'מסעדות ובתי קפה')]
+
+
+def test_import_master_file_keeps_a_backup(config):
+    data_folder = Path(config['folders']['data'])
+    data_folder.mkdir(parents=True)
+    master_file = data_folder / config['excel']['master_file']
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['תאריך', 'כרטיס', 'בית עסק', 'סכום', 'מטבע', 'קטגוריה',
+               'תשלומים', 'מקור', 'עובד', 'פרטים', 'הערה שלי'])
+    ws.append(['01/02/2025', '1234', 'רמי לוי', 50, '₪', 'מזון וסופרמרקט',
+               '', 'a.xls', '2025-02-05', '', 'note'])
+    wb.create_sheet('סיכום')['A1'] = '=SUM(D:D)'
+    wb.save(master_file)
+
+    ledger = Ledger(config)
+
+    assert len(ledger) == 1
+    assert next(ledger.iter_rows())[:3] == ('2025-02-01', '1234', 'רמי לוי')
+
+    # The next export rewrites the master file; the original survives
+    backup = openpyxl.load_workbook(data_folder / 'מעקב_חיובים.pre-ledger.xlsx')
+    assert backup['סיכום']['A1'].value == '=SUM(D:D)'
+    assert backup.active.cell(row=2, column=11).value == 'note'
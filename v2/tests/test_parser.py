@@ -0,0 +1,68 @@
+"""
+Tests for statement parsing.
+"""
+
+import re
+import zipfile
+from datetime import datetime
+
+import openpyxl
+import pytest
+
+from fincat.parser import ExcelParser
+
+HEADERS = ['תאריך עסקה', '4 ספרות', 'שם בית העסק', 'סכום חיוב', 'מטבע', 'פרטים נוספים']
+
+ROWS = [
+    [datetime(2025, 1, 3), '1834', 'שופרסל דיל', 312.5, '₪', ''],
+    [datetime(2025, 1, 4), '1834', 'קפה גרג', 18.0, '₪', ''],
+    [datetime(2025, 1, 9), '1834', 'פז ילו', 250.0, '₪', ''],
+    [datetime(2025, 1, 15), '1834', 'נטפליקס', 49.9, '₪', ''],
+    [datetime(2025, 1, 20), '1834', 'רמי לוי', 401.2, '₪', 'תשלום 1 מתוך 3'],
+]
+
+
+def write_statement(path, dimension: str = None):
+    """Write a 5-transaction .xlsx statement, optionally with a wrong <dimension>."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(HEADERS)
+    for row in ROWS:
+        ws.append(row)
+    wb.save(path)
+
+    if dimension is None:
+        return
+
+    # Exporters other than Excel sometimes write a stale dimension
+    original = path.with_name('original.xlsx')
+    path.rename(original)
+    with zipfile.ZipFile(original) as source, zipfile.ZipFile(path, 'w') as target:
+        for item in source.infolist():
+            data = source.read(item.filename)
+            if item.filename == 'xl/worksheets/sheet1.xml':
+                data = re.sub(rb'<dimension ref="[^"]*"',
+                              f'<dimension ref="{dimension}"'.encode(), data)
+            target.writestr(item, data)
+
+
+def test_parse_xlsx(config, tmp_path):
+    path = tmp_path / 'statement.xlsx'
+    write_statement(path)
+
+    transactions = ExcelParser(config).parse(path)
+
+    assert [t.business_name for t in transactions] == [row[2] for row in ROWS]
+    assert transactions[0].amount == 312.5
+    assert transactions[0].source_filename == 'statement.xlsx'
+
+
+@pytest.mark.parametrize('dimension', ['A1:F3', 'A1:B3'])
+def test_parse_xlsx_ignores_wrong_dimension(config, tmp_path, dimension):
+    path = tmp_path / 'statement.xlsx'
+    write_statement(path, dimension)
+
+    transactions = ExcelParser(config).parse(path)
+
+    assert len(transactions) == len(ROWS)
+    assert [t.amount for t in transactions] == [row[3] for row in ROWS]